@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compare finding the protobuf in an album page directly vs with BeautifulSoup
+
+Run from the repository root, with pages saved from a browser or curl:
+
+    python -m benchmarks.extract_protobuf saved-album.html [...]
+
+Without any pages, a synthetic one is built around each example protobuf.
+"""
+
+import argparse
+import json
+import timeit
+from pathlib import Path
+
+from photoalbum.album import Album
+from photoalbum.extract import extract_protobuf
+
+EXAMPLES = Path(__file__).parent.parent / "protobuf-examples" / "2022"
+
+# Roughly the shape of a real album page: lots of minified JS around the data
+FILLER_SCRIPT = (
+    '<script nonce="abc">var _F_x=function(a){return a.b[0]||null};'
+    + "_F_y(1,'[x]');" * 2000
+    + "</script>\n"
+)
+
+
+def synthetic_page(protobuf: list, filler_scripts: int = 100) -> str:
+    data = json.dumps(protobuf)
+    callback = f"<script nonce=\"abc\">AF_initDataCallback({{key: 'ds:0', hash: '1', data:{data}, sideChannel: {{}}}});</script>\n"
+    half = filler_scripts // 2
+    return (
+        "<!doctype html><html><head>"
+        + FILLER_SCRIPT * half
+        + callback
+        + FILLER_SCRIPT * half
+        + "</head><body></body></html>"
+    )
+
+
+def soup_extract(page: str) -> list | None:
+    album = Album()
+    album._parse_page(page, "html.parser")
+    return album.protobuf
+
+
+def bench(name: str, page: str, number: int) -> None:
+    expected = soup_extract(page)
+    if extract_protobuf(page) != expected:
+        print(f"{name}: direct extraction doesn't match BeautifulSoup, skipping")
+        return
+    direct = min(timeit.repeat(lambda: extract_protobuf(page), number=number, repeat=3))
+    soup = min(timeit.repeat(lambda: soup_extract(page), number=number, repeat=3))
+    print(
+        f"{name} ({len(page) / 1e6:.1f} MB): direct {direct / number * 1000:.2f} ms, "
+        f"BeautifulSoup {soup / number * 1000:.2f} ms, {soup / direct:.0f}x faster"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", type=Path, help="Saved album pages")
+    parser.add_argument("--number", type=int, default=5, help="Runs per timing")
+    args = parser.parse_args()
+
+    if args.pages:
+        for path in args.pages:
+            bench(path.name, path.read_text(), args.number)
+    else:
+        for path in sorted(EXAMPLES.glob("*.json")):
+            with path.open() as f:
+                bench(path.stem, synthetic_page(json.load(f)), args.number)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Generate a large synthetic album protobuf, shaped like protobuf-examples/2022
+
+Run from the repository root:
+
+    python -m benchmarks.generate --images 50000 --texts 5000 album.json
+
+The output can be used with `scraper.py --load`. Image URLs point at
+--base-url, eg a benchmarks.server instance.
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+
+ORDERING_KEY = "101428965"
+ENRICHMENT_KEY = "99218341"
+
+PLACES = [
+    ("Vancouver", "BC, Canada", 49.2827291, -123.1207375),
+    ("Greenwich", "London, UK", 51.4933675, 0.0098213),
+    ("Schiphol Airport", "Schiphol, Netherlands", 52.3094696, 4.7638029),
+    ("Trout Lake Community Centre", "Vancouver, BC, Canada", 49.2553604, -123.065345),
+    ("Canada", None, 56.130366, -106.346771),
+]
+
+
+def media_key(rng: random.Random, length: int = 44) -> str:
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    return "AF1Qip" + "".join(rng.choice(alphabet) for _ in range(length - 6))
+
+
+def ordering_str(position: int) -> str:
+    """Sortable ordering string like the ones Google uses, eg vdh9cohf06vt00000000004a"""
+    return f"vdh9{position:012x}0000004a"
+
+
+def place(rng: random.Random) -> list:
+    name, address, lat, lon = rng.choice(PLACES)
+    ids = [str(rng.getrandbits(63)), str(rng.getrandbits(63))]
+    return [
+        3,
+        [ids],
+        None,
+        name,
+        address,
+        [round(lat * 1e7), round(lon * 1e7)],
+        None,
+        0,
+    ]
+
+
+def image_item(rng: random.Random, position: int, base_url: str) -> list:
+    file_id = "".join(
+        rng.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789")
+        for _ in range(27)
+    )
+    width, height = rng.choice([(4608, 3456), (3456, 4608), (4032, 3024), (1920, 1080)])
+    timestamp = 1654000000000 + position * 1000
+    return [
+        media_key(rng),
+        [
+            f"{base_url}/{file_id}",
+            width,
+            height,
+            None,
+            [],
+            None,
+            [],
+            None,
+            None,
+            [rng.randint(10**6, 10**7)],
+        ],
+        timestamp,
+        file_id,
+        -25200000,
+        timestamp + 500000000,
+        [media_key(rng, 32)],
+        [[2], [31, False, True], [36, False, True], [8], [21], [19], [22]],
+        2,
+        None,
+        None,
+        None,
+        [],
+        None,
+        19222,
+        [],
+        {ORDERING_KEY: [0, ordering_str(position)]},
+    ]
+
+
+def enrichment_item(kind: str, rng: random.Random, position: int) -> list:
+    if kind == "text":
+        content = [
+            1,
+            [f"Text enrichment {position} " + "lorem ipsum " * rng.randint(1, 20)],
+        ]
+    elif kind == "location":
+        content = [2, None, [None, [place(rng)]]]
+    else:
+        content = [3, None, None, [None, None, None, [place(rng)], [place(rng)]]]
+    return [
+        media_key(rng),
+        *[None] * 6,
+        [],
+        *[None] * 4,
+        [],
+        None,
+        None,
+        [],
+        {ENRICHMENT_KEY: [content], ORDERING_KEY: [0, ordering_str(position)]},
+    ]
+
+
+def generate_album(
+    images: int = 1000,
+    texts: int = 100,
+    locations: int = 50,
+    maps: int = 20,
+    base_url: str = "https://lh3.googleusercontent.com",
+    seed: int = 0,
+) -> list:
+    """Album protobuf with the given number of each kind of item, in random order"""
+    rng = random.Random(seed)
+    kinds = (
+        ["image"] * images
+        + ["text"] * texts
+        + ["location"] * locations
+        + ["map"] * maps
+    )
+    rng.shuffle(kinds)
+    image_items = []
+    enrichment_items = []
+    for position, kind in enumerate(kinds):
+        if kind == "image":
+            image_items.append(image_item(rng, position, base_url))
+        else:
+            enrichment_items.append(enrichment_item(kind, rng, position))
+    # Like the examples, enrichments aren't in display order
+    rng.shuffle(enrichment_items)
+    album = [
+        media_key(rng, 70),
+        f"Synthetic album with {len(kinds)} items",
+        [1654022822000, 1654033897000, None, None, 1654554485407],
+        "",
+    ]
+    return [None, image_items, "", album, enrichment_items, 0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", type=Path, help="Where to write the protobuf JSON")
+    parser.add_argument("--images", type=int, default=10000)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--maps", type=int, default=200)
+    parser.add_argument("--base-url", default="https://lh3.googleusercontent.com")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    protobuf = generate_album(
+        args.images, args.texts, args.locations, args.maps, args.base_url, args.seed
+    )
+    with args.output.open("w") as f:
+        json.dump(protobuf, f)
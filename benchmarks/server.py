@@ -0,0 +1,85 @@
+"""Local HTTP stand-in for Google Photos, for benchmarks
+
+Serves an album page at /album and an image for any path under /img/, after
+a configurable latency. Images are JPEG headers padded to `image_bytes`.
+The album page has an ETag, and If-None-Match gets a 304 if it matches.
+
+    with AlbumServer(latency=0.02) as server:
+        server.set_album(generate_album(base_url=server.image_url))
+        Album().get_album(server.album_url)
+"""
+
+import hashlib
+import http.server
+import threading
+import time
+
+from .extract_protobuf import synthetic_page
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01"
+
+
+class AlbumServer:
+    def __init__(self, latency: float = 0.0, image_bytes: int = 100_000) -> None:
+        self.latency = latency
+        self.image = JPEG_HEADER + b"\0" * max(0, image_bytes - len(JPEG_HEADER))
+        self.page = b""
+        self.etag = ""
+        self.requests = 0
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                server.requests += 1
+                time.sleep(server.latency)
+                if self.path == "/album":
+                    if self.headers.get("If-None-Match") == server.etag:
+                        self.send_response(304)
+                        self.send_header("ETag", server.etag)
+                        self.end_headers()
+                        return
+                    self.respond(
+                        server.page,
+                        "text/html; charset=utf-8",
+                        {"ETag": server.etag},
+                    )
+                elif self.path.startswith("/img/"):
+                    self.respond(server.image, "image/jpeg")
+                else:
+                    self.send_error(404)
+
+            def respond(
+                self, body: bytes, content_type: str, headers: dict | None = None
+            ) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.album_url = f"{self.url}/album"
+        self.image_url = f"{self.url}/img"
+
+    def set_album(self, protobuf: list) -> None:
+        """Serve `protobuf` in a page shaped like a real album's"""
+        self.page = synthetic_page(protobuf).encode()
+        self.etag = f'"{hashlib.sha256(self.page).hexdigest()[:16]}"'
+
+    def __enter__(self) -> "AlbumServer":
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
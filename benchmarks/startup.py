@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Time `scraper.py --load ... --render`, the offline re-render path
+
+Run from the repository root:
+
+    python -m benchmarks.startup [--runs N] [PROTOBUF]
+
+Fails if the median run is slower than the target, or if the offline path
+imports any of the network or libmagic modules.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+EXAMPLE = (
+    ROOT
+    / "protobuf-examples"
+    / "2022"
+    / "9-item-test-album-loc-loc-loc-map-map-img-img-txt-txt.json"
+)
+
+# Median wall time for the whole process, including interpreter startup
+TARGET_MS = 250
+# Modules the offline path should never need
+ONLINE_MODULES = {"requests", "urllib3", "bs4", "magic"}
+
+
+def run(protobuf: Path, output_directory: str, importtime: bool = False) -> str:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += [
+        str(ROOT / "scraper.py"),
+        "--load",
+        str(protobuf),
+        "--render",
+        "--output-directory",
+        output_directory,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return result.stderr
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("protobuf", nargs="?", type=Path, default=EXAMPLE)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_directory:
+        # Check what gets imported. This also warms the template cache
+        imported = {
+            line.split("|")[-1].strip().split(".")[0]
+            for line in run(
+                args.protobuf, output_directory, importtime=True
+            ).splitlines()
+            if line.startswith("import time:")
+        }
+
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            run(args.protobuf, output_directory)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    median = statistics.median(timings)
+    print(
+        f"--load --render: median {median:.0f} ms, min {min(timings):.0f} ms "
+        f"over {args.runs} runs (target {TARGET_MS} ms)"
+    )
+    failed = False
+    if online := ONLINE_MODULES & imported:
+        print(f"Offline path imported {', '.join(sorted(online))}")
+        failed = True
+    if median > TARGET_MS:
+        print("Slower than target")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Time each stage of scraping a large synthetic album
+
+Run from the repository root:
+
+    python -m benchmarks.suite [--images 10000] [--json results.json]
+    python -m benchmarks.suite --baseline results.json
+
+Covers get_album extraction, with and without an unchanged page in a
+PageCache, parse_protobuf, find_local_images,
+download_images and render_html, against a generated album served by a
+local benchmarks.server. With --baseline, fails if any stage is more than
+--tolerance slower than in the saved results.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from photoalbum.album import Album
+from photoalbum.page_cache import PageCache
+
+from .generate import generate_album
+from .server import AlbumServer
+
+
+def best_of(
+    repeat: int, setup: Callable[[], Album], run: Callable[[Album], object]
+) -> float:
+    """Fastest of `repeat` runs of `run`, each on a fresh album from `setup`"""
+    timings = []
+    for _ in range(repeat):
+        album = setup()
+        start = time.perf_counter()
+        run(album)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_suite(args: argparse.Namespace, directory: Path) -> dict[str, float]:
+    results = {}
+    with AlbumServer(latency=args.latency, image_bytes=args.image_bytes) as server:
+        protobuf = generate_album(
+            args.images, args.texts, args.locations, args.maps, server.image_url
+        )
+        server.set_album(protobuf)
+        items = args.images + args.texts + args.locations + args.maps
+        print(
+            f"Album of {items} items, {len(server.page) / 1e6:.1f} MB page, "
+            f"{args.latency * 1000:.0f} ms latency"
+        )
+
+        def parsed() -> Album:
+            album = Album()
+            album.protobuf = protobuf
+            album.parse_protobuf()
+            album.output_directory = directory
+            album.album_directory = Path("album")
+            return album
+
+        results["get_album"] = best_of(
+            args.repeat, Album, lambda album: album.get_album(server.album_url)
+        )
+
+        page_cache = PageCache(directory / "page-cache")
+        Album().get_album(server.album_url, cache=page_cache)
+        results["get_album_cached"] = best_of(
+            args.repeat,
+            Album,
+            lambda album: album.get_album(server.album_url, cache=page_cache),
+        )
+
+        def unparsed() -> Album:
+            album = Album()
+            album.protobuf = protobuf
+            return album
+
+        results["parse_protobuf"] = best_of(
+            args.repeat, unparsed, lambda album: album.parse_protobuf()
+        )
+
+        # Download a sample of the images, each run into an empty directory
+        run_number = 0
+
+        def sample() -> Album:
+            nonlocal run_number
+            run_number += 1
+            album = parsed()
+            album.album_directory = Path(f"download-{run_number}")
+            assert album.images is not None
+            album.images = album.images[: args.download_images]
+            return album
+
+        results["download_images"] = best_of(
+            args.repeat,
+            sample,
+            lambda album: album.download_images(jobs=args.jobs),
+        )
+
+        # Put a file in place for every image, without downloading them all
+        full_directory = parsed().full_directory
+        full_directory.mkdir(parents=True, exist_ok=True)
+        for image in parsed().images or []:
+            (full_directory / f"{image.file_id}.jpg").write_bytes(server.image[:64])
+
+        results["find_local_images"] = best_of(
+            args.repeat, parsed, lambda album: album.find_local_images()
+        )
+
+        def local() -> Album:
+            album = parsed()
+            album.find_local_images()
+            return album
+
+        results["render_html"] = best_of(
+            args.repeat,
+            local,
+            lambda album: album.render_html(page_size=args.page_size),
+        )
+    return results
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], tolerance: float
+) -> list[str]:
+    """Stages more than `tolerance` slower than `baseline`"""
+    slower = []
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * (1 + tolerance):
+            slower.append(name)
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=10000)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--maps", type=int, default=200)
+    parser.add_argument(
+        "--download-images",
+        type=int,
+        default=500,
+        help="Number of images to download in the download_images benchmark",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Seconds per request"
+    )
+    parser.add_argument("--image-bytes", type=int, default=200_000)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=None)
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per benchmark, the fastest is kept"
+    )
+    parser.add_argument("--json", type=Path, help="Save the results here")
+    parser.add_argument("--baseline", type=Path, help="Results to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown against --baseline. Default: 0.2 (20%%)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_suite(args, Path(directory))
+
+    baseline = {}
+    if args.baseline:
+        with args.baseline.open() as f:
+            baseline = json.load(f)
+    for name, seconds in results.items():
+        line = f"{name:>18}: {seconds * 1000:9.1f} ms"
+        if name == "download_images":
+            line += f" ({args.download_images / seconds:.0f} images/s)"
+        if name in baseline:
+            line += f" (baseline {baseline[name] * 1000:.1f} ms)"
+        print(line)
+
+    if args.json:
+        with args.json.open("w") as f:
+            json.dump(results, f, indent=2)
+    if slower := compare(results, baseline, args.tolerance):
+        print(f"Slower than baseline: {', '.join(slower)}")
+        sys.exit(1)
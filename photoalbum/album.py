@@ -1,14 +1,76 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import hashlib
 import json
+import logging
+import os
 import re
+import time
+import zlib
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Sequence
 
 import jinja2
-import requests
-from bs4 import BeautifulSoup
-from slugify import slugify
 
+from . import snapshot
+from .assets import ASSET_MANIFEST, StaticAssets, precompress, remove_precompressed
+from .directory_index import DirectoryIndex
 from .enrichments import Enrichments
+from .extract import extract_protobuf
 from .image import Image
+from .manifest import Manifest
+from .maps import overview_map, page_maps
+from .tiles import DEFAULT_TILE_URL, TileCache, tiles_for_enrichment, tiles_for_fit
+from .video import Video
+
+# Fetching and downloading pull in requests and bs4, which are slow to
+# import. They're imported when used so --load --render doesn't pay for them.
+if TYPE_CHECKING:
+    import requests
+
+    from .downloader import Downloader, DownloadStatus, DownloadSummary
+    from .metrics import AlbumHooks
+    from .optimize import Optimizer
+    from .page_cache import PageCache
+    from .scheduler import RequestScheduler
+    from .store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_CACHE_DIRECTORY = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    / "photoalbum"
+    / "templates"
+)
+
+
+def ordering_key(item: Enrichments | Image) -> str:
+    """Sort key putting items in display order"""
+    return item.ordering_str or ""
+
+
+@functools.cache
+def template_environment() -> jinja2.Environment:
+    """Jinja environment for the album templates, shared by every render
+
+    Compiled templates are cached on disk in TEMPLATE_CACHE_DIRECTORY, so
+    later runs skip compiling them.
+    """
+    bytecode_cache = None
+    try:
+        TEMPLATE_CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIRECTORY))
+    except OSError:
+        logger.warning(
+            "Can't create %s, not caching templates", TEMPLATE_CACHE_DIRECTORY
+        )
+    return jinja2.Environment(
+        loader=jinja2.PackageLoader(__name__),
+        bytecode_cache=bytecode_cache,
+        auto_reload=False,
+    )
 
 
 class Album:
@@ -20,32 +82,158 @@ class Album:
     ENRICHMENT_ARRAY_INDEX = 4
 
     HTML_TEMPLATE = "index.html.j2"
+    VARIANT_DIRECTORY_REGEX = re.compile(r"w(\d+)")
+    TILE_DIRECTORY = "tiles"
 
     def __init__(self) -> None:
         self.album_url: str | None = None
         self.soup = None
         self.protobuf: list | None = None
         self.name: str | None = None
-        self.enrichments: list[Enrichments] | None = None
-        self.images: list[Image] | None = None
+        self._enrichments: tuple[Enrichments, ...] | None = None
+        self._images: tuple[Image, ...] | None = None
+        # All the items in display order, built by ordered_items()
+        self._ordering: list[Enrichments | Image] | None = None
+        self.local_index: DirectoryIndex | None = None
+        self.manifest: Manifest | None = None
+        # ETag, Last-Modified and SHA-256 of the last album page fetched
+        self.validators: dict[str, str] = {}
 
         self.output_directory = Path(".")
-        self.album_directory = None
+        self._album_directory: Path | None = None
         self.html_filename = "index.html"
+        self.tile_url = DEFAULT_TILE_URL
+        self.hooks: list[AlbumHooks] = []
 
-    def get_album(self, album_url: str, parser: str = "html.parser") -> None:
-        """Fetch album from URL, parse to protobuf"""
+    @contextlib.contextmanager
+    def _phase(self, phase: str) -> Iterator[None]:
+        """Time `phase`, telling `hooks` when it starts and finishes"""
+        for hook in self.hooks:
+            hook.phase_started(self, phase)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            logger.debug("%s took %.3fs", phase, seconds)
+            for hook in self.hooks:
+                hook.phase_finished(self, phase, seconds)
+
+    def _image_finished(
+        self, image: Image, status: DownloadStatus, seconds: float, size_bytes: int
+    ) -> None:
+        for hook in self.hooks:
+            hook.image_finished(self, image, status, seconds, size_bytes)
+
+    def get_album(
+        self,
+        album_url: str,
+        parser: str = "html.parser",
+        session: requests.Session | RequestScheduler | None = None,
+        cache: PageCache | None = None,
+    ) -> bool:
+        """Fetch album from URL, parse to protobuf. False if unchanged since `validators`"""
         self.album_url = album_url
-        print(f"Fetching {self.album_url}")
+        logger.info("Fetching %s", self.album_url)
+
+        if session is None:
+            from .scheduler import RequestScheduler
+
+            session = RequestScheduler()
+        # Without validators from an earlier fetch, revalidate the cached page,
+        # and use the protobuf cached from it if it hasn't changed
+        cached = None
+        if cache is not None and not self.validators:
+            cached = cache.get(self.album_url)
+        validators = self.validators or cached or {}
+        headers = {}
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+        with self._phase("fetch"), session.get(
+            self.album_url, headers=headers
+        ) as response:
+            if response.status_code not in (200, 304):
+                raise RuntimeError(
+                    f"Error fetching {self.album_url}: {response.status_code}"
+                )
+            content = response.content
+
+        # Not modified, so use the cached protobuf or leave `protobuf` alone
+        if response.status_code == 304:
+            logger.debug("%s not modified", self.album_url)
+            if cache is not None:
+                cache.store(self.album_url, validators)
+            if cached is None:
+                return False
+            assert cache is not None
+            return self._load_cached(cache, cached, parser, session)
+
+        sha256 = hashlib.sha256(content).hexdigest()
+        unchanged = sha256 == validators.get("sha256")
+        self.validators = {"sha256": sha256}
+        if "ETag" in response.headers:
+            self.validators["etag"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            self.validators["last_modified"] = response.headers["Last-Modified"]
+        if unchanged:
+            logger.debug("%s unchanged", self.album_url)
+            if cache is not None:
+                cache.store(self.album_url, self.validators)
+            if cached is None:
+                return False
+            assert cache is not None
+            return self._load_cached(cache, self.validators, parser, session)
 
+        with self._phase("extract"):
+            self.protobuf = extract_protobuf(content)
+            # `parser` is only needed if the protobuf isn't in the raw page
+            if self.protobuf is None:
+                logger.info(
+                    "Protobuf not found directly, parsing response with %s", parser
+                )
+                self._parse_page(response.text, parser)
+        logger.debug("Found protobuf")
+        if cache is not None:
+            cache.store(self.album_url, self.validators, self.protobuf)
+            cache.evict()
+        return True
+
+    def _load_cached(
+        self,
+        cache: PageCache,
+        validators: dict[str, str],
+        parser: str,
+        session: requests.Session | RequestScheduler,
+    ) -> bool:
+        """Use the protobuf `cache` has for the page, which hasn't changed
+
+        If it can't be read, it's dropped from the cache and the page is
+        fetched again in full.
+        """
+        assert self.album_url
+        logger.debug("Using cached protobuf for %s", self.album_url)
         try:
-            response = requests.get(self.album_url)
-        except Exception:
-            print(f"Error fetching {self.album_url}")
-            return
+            with self._phase("load"):
+                self.protobuf = cache.load(self.album_url)
+        except (OSError, EOFError, ValueError, zlib.error) as e:
+            logger.warning(
+                "Can't read cached page for %s, fetching it again: %s",
+                self.album_url,
+                e,
+            )
+            cache.remove(self.album_url)
+            self.validators = {}
+            return self.get_album(self.album_url, parser, session, cache)
+        self.validators = validators
+        return True
 
-        print(f"Parsing response with {parser}")
-        self.soup = BeautifulSoup(response.text, features=parser)
+    def _parse_page(self, page: str, parser: str) -> None:
+        """Find the protobuf by parsing the whole page. Slower than `extract_protobuf`"""
+        from bs4 import BeautifulSoup
+
+        self.soup = BeautifulSoup(page, features=parser)
 
         # Find the spot where the protobuf is defined
         target = self.soup.find_all(string=re.compile(self.PROTOBUF_REGEX))[0]
@@ -54,101 +242,429 @@ class Album:
 
         # Load the protobuf to json. If this works we probably have the right thing
         self.protobuf = json.loads(target[start:end])
-        print("Found protobuf")
 
     def load_protobuf(self, protobuf_file: Path) -> None:
-        """Read the protobuf from a JSON file"""
-        print(f"Loading protobuf from {protobuf_file}")
-        with open(protobuf_file, "r") as f:
-            self.protobuf = json.load(f)
+        """Read the protobuf from a file written by `write_protobuf`, in either format"""
+        logger.info("Loading protobuf from %s", protobuf_file)
+        with self._phase("load"):
+            self.protobuf = snapshot.read_protobuf(protobuf_file)
+
+    def load_parsed(self, protobuf_file: Path) -> None:
+        """Load and parse the protobuf from a file, without keeping it
+
+        A compact file is parsed as it's read, an item at a time, so the
+        whole protobuf is never in memory. That's all timed as "load". Other
+        files are loaded, then parsed.
+        """
+        if not snapshot.is_compact(protobuf_file):
+            self.load_protobuf(protobuf_file)
+            self.parse_protobuf()
+            return
+        logger.info("Loading protobuf from %s", protobuf_file)
+        with self._phase("load"), snapshot.CompactReader(protobuf_file) as reader:
+            self.name = reader.skeleton[self.ALBUM_ARRAY_INDEX][1]
+            images: list[Image] = []
+            enrichments: list[Enrichments] = []
+            for index, item in reader.items():
+                if index == self.IMAGE_ARRAY_INDEX:
+                    images.append(self._parse_image(item))
+                elif index == self.ENRICHMENT_ARRAY_INDEX:
+                    enrichment = self._parse_enrichment(item)
+                    if enrichment:
+                        enrichments.append(enrichment)
+            self.images = images
+            self.enrichments = enrichments
+            self.ordered_items()
+
+    def write_protobuf(self, protobuf_file: Path, compact: bool = False) -> None:
+        """Write the protobuf as formatted JSON, or compactly. Do this before parsing it
 
-    def write_protobuf(self, protobuf_file: Path) -> None:
-        """Write the protobuf as formatted JSON."""
+        The compact format is smaller, and quicker to load. See `snapshot`.
+        """
         if self.protobuf is None:
-            raise RuntimeError("Must fetch or load album first")
+            raise RuntimeError(
+                "Must fetch or load album first, and write it before parsing"
+            )
+
+        logger.info("Writing protobuf to %s", protobuf_file)
+        snapshot.write_protobuf(
+            self.protobuf,
+            protobuf_file,
+            compact=compact,
+            arrays=(self.IMAGE_ARRAY_INDEX, self.ENRICHMENT_ARRAY_INDEX),
+        )
 
-        print(f"Writing protobuf to {protobuf_file}")
-        with protobuf_file.open("w") as f:
-            json.dump(self.protobuf, f, indent=4)
+    def parse_protobuf(self, keep_protobuf: bool = False) -> None:
+        """Parse the protobuf to get album, image, text and map info
 
-    def parse_protobuf(self) -> None:
-        """Parse the protobuf to get album, image, text and map info"""
+        Afterwards the protobuf, and the page it came from, are dropped, so
+        the album only holds the parsed items. Pass `keep_protobuf` to keep
+        them, and each item's part of the protobuf, for debugging.
+        """
         if self.protobuf is None:
             raise RuntimeError("Must fetch or load album first")
-        self.name = self.protobuf[self.ALBUM_ARRAY_INDEX][1]
-        self._parse_enrichments()
-        self._parse_images()
-        self.album_directory = Path(slugify(self.name))
-
-    def _parse_images(self) -> None:
-        """Parse the images array in the protobuf"""
-        print("Parsing images")
-        self.images = []
-        for img in self.protobuf[self.IMAGE_ARRAY_INDEX]:
-            image = Image(img)
-            image.parse_protobuf()
-            self.images.append(image)
-
-    def _parse_enrichments(self) -> None:
+        with self._phase("parse"):
+            self.name = self.protobuf[self.ALBUM_ARRAY_INDEX][1]
+            self._parse_enrichments(self.protobuf, keep_protobuf)
+            self._parse_images(self.protobuf, keep_protobuf)
+            self.ordered_items()
+        if not keep_protobuf:
+            self.protobuf = None
+            self.soup = None
+
+    def _parse_images(self, protobuf: list, keep_protobuf: bool) -> None:
+        """Parse the images array in the protobuf, which has the videos too"""
+        logger.debug("Parsing images")
+        self.images = [
+            self._parse_image(img, keep_protobuf)
+            for img in protobuf[self.IMAGE_ARRAY_INDEX]
+        ]
+
+    def _parse_enrichments(self, protobuf: list, keep_protobuf: bool) -> None:
         """Parse the text, maps and locations from the protobuf"""
-        print("Parsing enrichments (text, maps, locations)")
-        self.enrichments = []
-        for enrichment in self.protobuf[self.ENRICHMENT_ARRAY_INDEX]:
-            enrichment = Enrichments.create_enrichment(enrichment)
-            if not enrichment:
-                continue
-            enrichment.parse_protobuf()
-            self.enrichments.append(enrichment)
+        logger.debug("Parsing enrichments (text, maps, locations)")
+        enrichments = []
+        for item in protobuf[self.ENRICHMENT_ARRAY_INDEX]:
+            enrichment = self._parse_enrichment(item, keep_protobuf)
+            if enrichment:
+                enrichments.append(enrichment)
+        self.enrichments = enrichments
+
+    @staticmethod
+    def _parse_image(item: list, keep_protobuf: bool = False) -> Image:
+        image = Video(item) if Video.is_video(item) else Image(item)
+        image.parse_protobuf(keep_protobuf)
+        return image
+
+    @staticmethod
+    def _parse_enrichment(
+        item: list, keep_protobuf: bool = False
+    ) -> Enrichments | None:
+        enrichment = Enrichments.create_enrichment(item)
+        if enrichment:
+            enrichment.parse_protobuf(keep_protobuf)
+        return enrichment
+
+    @property
+    def images(self) -> tuple[Image, ...] | None:
+        """The images and videos. A tuple, so changing them means setting them, which rebuilds the display order"""
+        return self._images
+
+    @images.setter
+    def images(self, images: Sequence[Image] | None) -> None:
+        self._images = None if images is None else tuple(images)
+        self._ordering = None
+
+    @property
+    def enrichments(self) -> tuple[Enrichments, ...] | None:
+        """The text, locations and maps. A tuple, like `images`"""
+        return self._enrichments
+
+    @enrichments.setter
+    def enrichments(self, enrichments: Sequence[Enrichments] | None) -> None:
+        self._enrichments = None if enrichments is None else tuple(enrichments)
+        self._ordering = None
+
+    @property
+    def album_directory(self) -> Path:
+        """Name of the album's directory. Default: slugified album name"""
+        if self._album_directory is None:
+            if self.name is None:
+                raise RuntimeError("Must parse album first")
+            from slugify import slugify
+
+            self._album_directory = Path(slugify(self.name))
+        return self._album_directory
+
+    @album_directory.setter
+    def album_directory(self, album_directory: Path) -> None:
+        self._album_directory = album_directory
 
     @property
     def full_directory(self) -> Path:
         """Full output path"""
         return self.output_directory / self.album_directory
 
+    @property
+    def manifest_path(self) -> Path:
+        """Download manifest, kept next to the HTML"""
+        return self.full_directory / Manifest.FILENAME
+
+    def load_manifest(self) -> Manifest:
+        """Read the download manifest from `full_directory`"""
+        self.manifest = Manifest.load(self.manifest_path)
+        return self.manifest
+
+    def scan_directory(self) -> DirectoryIndex:
+        """Index the files already in `full_directory` with one pass"""
+        self.local_index = DirectoryIndex(self.full_directory)
+        for file_id, paths in self.local_index.duplicates.items():
+            logger.warning(
+                "Multiple files found for %s: %s", file_id, ", ".join(map(str, paths))
+            )
+        return self.local_index
+
     def download_images(
         self,
         max_width: int | None = None,
         max_height: int | None = None,
         redownload: bool = False,
-    ) -> None:
-        """Download all images in the album to `full_directory`"""
-        print(f"Downloading images to {self.full_directory}")
+        jobs: int = 1,
+        downloader: Downloader | None = None,
+        store: BlobStore | None = None,
+        variant_widths: list[int] | None = None,
+        images: list[Image] | None = None,
+    ) -> DownloadSummary:
+        """Download all images in the album to `full_directory`, or just `images`
+
+        Up to `jobs` images are downloaded at once. Pass a shared `downloader`
+        to draw from its workers and connection pool instead. Images already
+        in `store` are linked from it rather than downloaded. Smaller copies
+        for each of `variant_widths` are downloaded too, for `srcset`.
+        """
+        from .downloader import Downloader
+
+        assert self.images is not None
+        logger.info("Downloading images to %s", self.full_directory)
         self.full_directory.mkdir(parents=True, exist_ok=True)
-        for image in self.images:
-            image.download_image(
-                self.full_directory,
-                max_width=max_width,
-                max_height=max_height,
-                redownload=redownload,
-            )
+        with self._phase("scan"):
+            index = self.scan_directory()
+            manifest = self.load_manifest()
+        if store is not None:
+            store.register_album(self.full_directory)
+        owns_downloader = downloader is None
+        if downloader is None:
+            downloader = Downloader(jobs=jobs)
+        try:
+            with self._phase("download"):
+                summary = downloader.download_images(
+                    self.images if images is None else images,
+                    self.full_directory,
+                    max_width=max_width,
+                    max_height=max_height,
+                    redownload=redownload,
+                    index=index,
+                    manifest=manifest,
+                    store=store,
+                    variant_widths=variant_widths,
+                    on_image=self._image_finished if self.hooks else None,
+                )
+        finally:
+            if owns_downloader:
+                downloader.close()
+            manifest.save()
+        summary.print_summary()
+        return summary
+
+    def prune_images(self) -> list[Path]:
+        """Delete downloaded images that are no longer in the album
+
+        Only files recorded in the manifest are removed.
+        """
+        assert self.images is not None
+        manifest = self.manifest or self.load_manifest()
+        removed = []
+        for file_id in manifest.missing_from(self.images):
+            entry = manifest.remove(file_id)
+            assert entry
+            path = self.full_directory / entry["path"]
+            logger.info("Removing %s, no longer in album", path)
+            path.unlink(missing_ok=True)
+            if "optimized" in entry:
+                (self.full_directory / entry["optimized"]["path"]).unlink(
+                    missing_ok=True
+                )
+            for variant in self.full_directory.glob(f"w*/{file_id}.*"):
+                variant.unlink()
+            if self.local_index:
+                self.local_index.remove(file_id)
+            removed.append(path)
+        manifest.save()
+        return removed
+
+    def optimize_images(self, optimizer: Optimizer) -> list[Path]:
+        """Make optimized copies of the downloaded images for the HTML to use"""
+        assert self.images is not None
+        manifest = self.manifest or self.load_manifest()
+        try:
+            with self._phase("optimize"):
+                return optimizer.optimize_images(
+                    self.images, self.full_directory, manifest
+                )
+        finally:
+            manifest.save()
 
     def find_local_images(self) -> None:
-        """Check `full_directory` to see if all images are there already"""
-        print(f"Checking {self.full_directory} for existing images")
-        for image in self.images:
-            image.find_local_image(self.full_directory)
+        """Check `full_directory` to see if all images are there already
+
+        Optimized copies recorded in the manifest are found too.
+        """
+        logger.info("Checking %s for existing images", self.full_directory)
+        with self._phase("scan"):
+            index = self.scan_directory()
+            variant_indexes = self.scan_variant_directories()
+            manifest = Manifest.load(self.manifest_path)
+            for image in self.images:
+                image.find_local_image(self.full_directory, index=index)
+                image.find_local_variants(variant_indexes)
+                entry = manifest.entries.get(str(image.file_id))
+                if entry:
+                    image.downloaded_width = image.scaled_width(entry["size"])
+                image.optimized_path = manifest.optimized_path(
+                    image, self.full_directory
+                )
+
+    def scan_variant_directories(self) -> dict[int, DirectoryIndex]:
+        """Index each `w<width>` directory of image variants, by width"""
+        variant_indexes = {}
+        if self.full_directory.is_dir():
+            for entry in os.scandir(self.full_directory):
+                match = self.VARIANT_DIRECTORY_REGEX.fullmatch(entry.name)
+                if match and entry.is_dir():
+                    width = int(match.group(1))
+                    variant_indexes[width] = DirectoryIndex(Path(entry.path))
+        return variant_indexes
 
     def ordered_items(self) -> list[Enrichments | Image]:
-        """All items in the album, sorted in display order"""
-        assert self.enrichments
-        assert self.images
-        ordering_dict: dict[str, Enrichments | Image] = {
-            x.ordering_str: x for x in self.enrichments + self.images
-        }
-        return [ordering_dict[k] for k in sorted(ordering_dict)]
+        """All items in the album, in display order
+
+        Built the first time it's needed, and again only if `images` or
+        `enrichments` are replaced. Don't modify the list returned.
+        """
+        if self._ordering is None:
+            self._ordering = self._merge_ordering()
+        return self._ordering
+
+    def _merge_ordering(self) -> list[Enrichments | Image]:
+        """Sort the enrichments and images together into display order
+
+        The images usually arrive in display order, but the enrichments
+        often don't. Timsort finds the runs that are already in order, so
+        this costs little more than merging them, and is quicker than
+        heapq.merge.
+        """
+        ordering: list[Enrichments | Image] = sorted(
+            [*(self.enrichments or []), *(self.images or [])], key=ordering_key
+        )
+        for previous, item in zip(ordering, ordering[1:]):
+            if previous.ordering_str == item.ordering_str:
+                self._warn_same_position(previous, item)
+        return ordering
+
+    @staticmethod
+    def _warn_same_position(a: Enrichments | Image, b: Enrichments | Image) -> None:
+        logger.warning(
+            "%s and %s have the same position (%s), so their order may change",
+            a,
+            b,
+            a.ordering_str,
+        )
 
     def print_ordering(self) -> None:
         """Print the album items in sorted order"""
         for item in self.ordered_items():
             print(item)
 
-    def render_html(self) -> Path:
-        """Render the album to a HTML file."""
-        env = jinja2.Environment(loader=jinja2.PackageLoader(__name__))
-        page_template = env.get_template(self.HTML_TEMPLATE)
-        html = page_template.render(album=self, items=self.ordered_items())
-        html_file = self.full_directory / self.html_filename
-        self.full_directory.mkdir(parents=True, exist_ok=True)
-        print(f"Writing HTML to {html_file}")
-        html_file.write_text(html)
-        return html_file
+    def prefetch_tiles(self, cache: TileCache, overview: bool = False) -> int:
+        """Fetch the map tiles the album shows into `full_directory`, and use them
+
+        Tiles come from `cache`, which fetches any it doesn't have from its
+        tile server. With `overview`, the tiles for the overview map are
+        fetched too. Returns the number of tiles in the album.
+        """
+        assert self.enrichments is not None
+        tiles = set()
+        for enrichment in self.enrichments:
+            tiles |= tiles_for_enrichment(enrichment)
+        overview_view = overview_map(self.enrichments) if overview else None
+        if overview_view:
+            tiles |= tiles_for_fit(overview_view["markers"])
+        logger.info("Prefetching %d map tiles from %s", len(tiles), cache.tile_url)
+        with self._phase("tiles"):
+            cached = cache.fetch(tiles)
+            cache.copy_to(cached, self.full_directory / self.TILE_DIRECTORY)
+            cache.evict()
+        self.tile_url = f"{self.TILE_DIRECTORY}/{{z}}/{{x}}/{{y}}.png"
+        return len(cached)
+
+    @staticmethod
+    def _page_maps(
+        items: list[Enrichments | Image], overview_view: dict | None
+    ) -> dict[str, dict]:
+        maps = page_maps(items)
+        if overview_view:
+            maps["overview"] = overview_view
+        return maps
+
+    def page_filename(self, number: int) -> str:
+        """File name of page `number` of the HTML, counting from 1"""
+        return str(self.html_filename) if number == 1 else f"page-{number}.html"
+
+    def render_html(
+        self,
+        page_size: int | None = None,
+        static_assets: bool = False,
+        overview: bool = False,
+    ) -> Path:
+        """Render the album to HTML pages of `page_size` items, returning the first page
+
+        With `static_assets`, CSS and JavaScript are linked from shared files
+        instead of inlined. With `overview`, each page starts with a map of
+        every place in the album.
+        """
+        with self._phase("render"):
+            environment = template_environment()
+            page_template = environment.get_template(self.HTML_TEMPLATE)
+            items = self.ordered_items()
+            page_size = page_size or len(items) or 1
+            pages = [items[i : i + page_size] for i in range(0, len(items), page_size)]
+            pages = pages or [[]]
+            filenames = [self.page_filename(n) for n in range(1, len(pages) + 1)]
+            overview_view = overview_map(items) if overview else None
+
+            self.full_directory.mkdir(parents=True, exist_ok=True)
+            assets = None
+            if static_assets:
+                assets = StaticAssets(self.output_directory)
+                assets.publish(environment)
+            for number, page_items in enumerate(pages, start=1):
+                pagination = {
+                    "number": number,
+                    "count": len(pages),
+                    "filenames": filenames,
+                    "previous": filenames[number - 2] if number > 1 else None,
+                    "next": filenames[number] if number < len(pages) else None,
+                }
+                html_file = self.full_directory / filenames[number - 1]
+                logger.info("Writing HTML to %s", html_file)
+                # Streamed rather than built in memory, and only replaces the
+                # old page once it's complete
+                temp_file = html_file.with_name(f".{html_file.name}.tmp")
+                with temp_file.open("wb") as f:
+                    page_template.stream(
+                        album=self,
+                        items=page_items,
+                        pagination=pagination,
+                        maps=self._page_maps(page_items, overview_view),
+                        assets=assets.hrefs(self.full_directory) if assets else None,
+                    ).dump(f, encoding="utf-8")
+                os.replace(temp_file, html_file)
+                if assets:
+                    precompress(html_file)
+                else:
+                    remove_precompressed(html_file)
+
+            # Remove pages left over from when the album had more of them
+            for old_page in self.full_directory.glob("page-*.html"):
+                if old_page.name not in filenames:
+                    logger.info("Removing %s", old_page)
+                    old_page.unlink()
+                    remove_precompressed(old_page)
+            if assets:
+                assets.write_manifest(
+                    self.full_directory,
+                    [self.full_directory / filename for filename in filenames],
+                )
+            else:
+                (self.full_directory / ASSET_MANIFEST).unlink(missing_ok=True)
+            return self.full_directory / filenames[0]
@@ -0,0 +1,132 @@
+"""Write rendered albums as static files that can be cached hard and served as-is"""
+
+from __future__ import annotations
+
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from types import ModuleType
+
+import jinja2
+
+from .atomic import write_atomic
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIRECTORY = "static"
+ASSET_MANIFEST = "assets.json"
+# Templates that are inlined into each page, or written out as shared files
+STATIC_TEMPLATES = ["album.css", "album.js"]
+PRECOMPRESSED_SUFFIXES = [".gz", ".br"]
+
+
+@functools.cache
+def _brotli() -> ModuleType | None:
+    try:
+        import brotli
+    except ImportError:
+        logger.warning("brotli isn't installed, so only writing .gz copies")
+        return None
+    module: ModuleType = brotli
+    return module
+
+
+def hashed_name(name: str, content: bytes) -> str:
+    """`name` with a hash of `content` before its extension, eg album.0123456789ab.css"""
+    stem, _, suffix = name.rpartition(".")
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}.{suffix}"
+
+
+def precompress(path: Path, overwrite: bool = True) -> list[Path]:
+    """Write .gz and, if brotli is installed, .br copies of `path` next to it
+
+    Without `overwrite`, copies that are already there are left alone.
+    Returns the copies written.
+    """
+    content = path.read_bytes()
+    written = []
+    compressors = {".gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    brotli = _brotli()
+    if brotli is not None:
+        compressors[".br"] = lambda data: brotli.compress(data, quality=11)
+    for suffix, compress in compressors.items():
+        compressed = path.with_name(path.name + suffix)
+        if overwrite or not compressed.exists():
+            write_atomic(compressed, compress(content))
+            written.append(compressed)
+    return written
+
+
+def remove_precompressed(path: Path) -> None:
+    """Remove copies of `path` written by `precompress`, which would be stale"""
+    for suffix in PRECOMPRESSED_SUFFIXES:
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+
+class StaticAssets:
+    """The album CSS and JavaScript, as content-hashed files shared between albums
+
+    They go in `output_directory/static`, along with their compressed
+    copies. A file's name changes whenever its content does, so they never
+    need revalidating. Old versions are left for pages that still use them.
+    """
+
+    def __init__(self, output_directory: Path) -> None:
+        self.output_directory = output_directory
+        self.directory = output_directory / STATIC_DIRECTORY
+        self.paths: dict[str, Path] = {}
+
+    def publish(self, environment: jinja2.Environment) -> dict[str, Path]:
+        """Write each of STATIC_TEMPLATES from `environment`'s loader, if it isn't there already"""
+        assert environment.loader
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name in STATIC_TEMPLATES:
+            source, _, _ = environment.loader.get_source(environment, name)
+            content = source.encode()
+            path = self.directory / hashed_name(name, content)
+            if not path.exists():
+                logger.info("Writing %s", path)
+                write_atomic(path, content)
+            precompress(path, overwrite=False)
+            self.paths[name] = path
+        return self.paths
+
+    def hrefs(self, directory: Path) -> dict[str, str]:
+        """Links to the published files from a page in `directory`"""
+        return {
+            name: Path(os.path.relpath(path, directory)).as_posix()
+            for name, path in self.paths.items()
+        }
+
+    def write_manifest(self, directory: Path, pages: list[Path]) -> Path:
+        """Write ASSET_MANIFEST into `directory`, listing what can be cached forever
+
+        Paths are relative to `output_directory`, as they'd be served.
+
+        {
+            "immutable": ["static/album.0123456789ab.css", ...],
+            "revalidate": ["my-album/index.html", ...],
+            "precompressed": [".gz", ".br"]
+        }
+        """
+        path = directory / ASSET_MANIFEST
+        manifest = {
+            "immutable": sorted(
+                self._served_path(asset) for asset in self.paths.values()
+            ),
+            "revalidate": [self._served_path(page) for page in pages],
+            "precompressed": [
+                suffix
+                for suffix in PRECOMPRESSED_SUFFIXES
+                if suffix == ".gz" or _brotli() is not None
+            ],
+        }
+        write_atomic(path, json.dumps(manifest, indent=1).encode())
+        return path
+
+    def _served_path(self, path: Path) -> str:
+        return Path(os.path.relpath(path, self.output_directory)).as_posix()
@@ -0,0 +1,29 @@
+"""Write files so nothing ever sees them half written"""
+
+import contextlib
+import os
+import uuid
+from pathlib import Path
+from typing import Iterator
+
+
+@contextlib.contextmanager
+def atomic_path(path: Path) -> Iterator[Path]:
+    """A temporary path to write instead of `path`, moved over it when the with block exits
+
+    The temporary path is unique, so other threads and processes can write
+    the same path at once. It doesn't exist yet, so it can be hardlinked to.
+    """
+    temp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield temp
+        os.replace(temp, path)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+
+def write_atomic(path: Path, content: bytes) -> None:
+    """Write `content` to `path` atomically"""
+    with atomic_path(path) as temp:
+        temp.write_bytes(content)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from .downloader import DownloadSummary
+
+logger = logging.getLogger(__name__)
+
+
+def read_sources(batch_file: Path) -> list[str]:
+    """Album URLs or protobuf paths from `batch_file`, one per line
+
+    Blank lines and lines starting with # are ignored.
+    """
+    sources = []
+    with batch_file.open("r") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                sources.append(line)
+    return sources
+
+
+def is_url(source: str) -> bool:
+    return source.startswith(("https://", "http://"))
+
+
+class BatchReport:
+    """Success or failure of each album in a batch"""
+
+    def __init__(self) -> None:
+        self.errors: dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def record(self, source: str, error: str | None = None) -> None:
+        with self._lock:
+            self.errors[source] = error
+
+    @property
+    def failed(self) -> list[str]:
+        return [source for source, error in self.errors.items() if error]
+
+    def print_report(self) -> None:
+        logger.info(
+            "Batch summary: %d succeeded, %d failed",
+            len(self.errors) - len(self.failed),
+            len(self.failed),
+        )
+        for source, error in self.errors.items():
+            if error:
+                logger.warning("  FAILED %s: %s", source, error)
+            else:
+                logger.info("  OK %s", source)
+
+
+def run_batch(
+    sources: list[str],
+    scrape: Callable[[str], DownloadSummary | None],
+    album_jobs: int = 1,
+) -> BatchReport:
+    """Call `scrape` on each source, up to `album_jobs` at a time
+
+    `scrape` should share one Downloader between albums, so image downloads
+    are capped globally rather than per album. An album fails if `scrape`
+    raises, or if any of its images failed to download.
+    """
+    report = BatchReport()
+
+    def run(source: str) -> None:
+        try:
+            summary = scrape(source)
+        except Exception as e:
+            logger.exception("Error processing %s", source)
+            report.record(source, f"{type(e).__name__}: {e}")
+            return
+        if summary and summary.failed:
+            report.record(source, f"{len(summary.failed)} images failed to download")
+        else:
+            report.record(source)
+
+    with ThreadPoolExecutor(
+        max_workers=album_jobs, thread_name_prefix="album"
+    ) as executor:
+        list(executor.map(run, sources))
+    # Report in the order given, not completion order
+    report.errors = {source: report.errors[source] for source in sources}
+    return report
@@ -0,0 +1,31 @@
+import os
+from pathlib import Path
+from typing import Iterable, TypeVar
+
+Key = TypeVar("Key")
+
+
+def mark_used(path: Path) -> None:
+    """Mark a cached file as recently used, so it's evicted last"""
+    os.utime(path)
+
+
+def entries_to_evict(
+    entries: Iterable[tuple[bool, float, int, Key]], max_bytes: int
+) -> list[Key]:
+    """Keys of the cache entries to delete so the rest fit in `max_bytes`
+
+    Each entry is (expired, last used time, size in bytes, key). Expired
+    entries are always evicted, then the least recently used until the rest
+    fit.
+    """
+    entries = list(entries)
+    total = sum(size for _, _, size, _ in entries)
+    evicted = []
+    # Expired entries first, then least recently used
+    for expired, _, size, key in sorted(entries, key=lambda e: (not e[0], e[1])):
+        if not expired and total <= max_bytes:
+            break
+        total -= size
+        evicted.append(key)
+    return evicted
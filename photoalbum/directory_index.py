@@ -0,0 +1,68 @@
+import os
+import threading
+from pathlib import Path
+
+# Compressed copies of the HTML, written next to it for static serving
+IGNORED_SUFFIXES = (".gz", ".br")
+
+
+class DirectoryIndex:
+    """In-memory index of the files in an album directory
+
+    Built with a single `os.scandir` pass, and keyed by the part of the file
+    name before the first "." - for images that's the file_id. Hidden files,
+    like partial downloads, and compressed copies of pages are ignored.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._files: dict[str, list[Path]] = {}
+        self._lock = threading.Lock()
+        self.scan()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def scan(self) -> None:
+        """(Re)build the index from the directory contents"""
+        files: dict[str, list[Path]] = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if (
+                        entry.name.startswith(".")
+                        or entry.name.endswith(IGNORED_SUFFIXES)
+                        or not entry.is_file()
+                    ):
+                        continue
+                    stem, dot, _ = entry.name.partition(".")
+                    if not dot:
+                        continue
+                    files.setdefault(stem, []).append(Path(entry.name))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._files = files
+
+    @property
+    def duplicates(self) -> dict[str, list[Path]]:
+        """file_ids with more than one matching file"""
+        with self._lock:
+            return {k: v for k, v in self._files.items() if len(v) > 1}
+
+    def get(self, file_id: str | Path) -> Path | None:
+        """Path of the file for `file_id`, relative to `directory`"""
+        with self._lock:
+            matches = self._files.get(str(file_id), [])
+        if len(matches) > 1:
+            raise RuntimeError(f"Multiple files found for {self.directory / file_id}.*")
+        return matches[0] if matches else None
+
+    def add(self, file_id: str | Path, relative_path: Path) -> None:
+        """Record that `relative_path` is now the file for `file_id`"""
+        with self._lock:
+            self._files[str(file_id)] = [relative_path]
+
+    def remove(self, file_id: str | Path) -> None:
+        with self._lock:
+            self._files.pop(str(file_id), None)
@@ -0,0 +1,290 @@
+import enum
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .directory_index import DirectoryIndex
+from .image import Image
+from .manifest import Manifest
+from .scheduler import RequestScheduler
+from .store import BlobStore
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadStatus(enum.Enum):
+    """Outcome of downloading a single image"""
+
+    DOWNLOADED = "downloaded"
+    LINKED = "linked from store"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+
+
+class DownloadSummary:
+    """Per-image download results, collected from all workers"""
+
+    def __init__(self) -> None:
+        self.results: dict[DownloadStatus, list[Image]] = {
+            status: [] for status in DownloadStatus
+        }
+        self.errors: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, image: Image, status: DownloadStatus, error: str | None = None
+    ) -> None:
+        with self._lock:
+            self.results[status].append(image)
+            if error:
+                self.errors[str(image.file_id)] = error
+
+    def count(self, status: DownloadStatus) -> int:
+        return len(self.results[status])
+
+    @property
+    def failed(self) -> list[Image]:
+        return self.results[DownloadStatus.FAILED]
+
+    def print_summary(self) -> None:
+        """Log totals, then each failure with its reason"""
+        totals = ", ".join(
+            f"{self.count(status)} {status.value}" for status in DownloadStatus
+        )
+        logger.info("Download summary: %s", totals)
+        for image in self.failed:
+            logger.warning(
+                "  Failed %s: %s", image.file_id, self.errors.get(str(image.file_id))
+            )
+
+
+class Downloader:
+    """Download images concurrently over one connection-pooled session
+
+    Share one between albums so they draw from the same workers, connections
+    and per-host limits.
+    """
+
+    def __init__(
+        self,
+        jobs: int = 1,
+        rate: float | None = None,
+        retries: int = 5,
+        segments: int = 1,
+    ) -> None:
+        if jobs < 1:
+            raise ValueError("jobs must be at least 1")
+        self.jobs = jobs
+        self.rate = rate
+        self.retries = retries
+        self.segments = segments
+        self._session: requests.Session | None = None
+        self._scheduler: RequestScheduler | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "Downloader":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @property
+    def session(self) -> requests.Session:
+        """Shared session, with a connection pool sized to the worker count"""
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.jobs)
+                self._session.mount("https://", adapter)
+                self._session.mount("http://", adapter)
+            return self._session
+
+    @property
+    def scheduler(self) -> RequestScheduler:
+        """Scheduler for all requests, sharing `session`"""
+        # Each host gets `rate` requests a second, with at most `jobs` in flight
+        session = self.session
+        with self._lock:
+            if self._scheduler is None:
+                self._scheduler = RequestScheduler(
+                    session,
+                    rate=self.rate,
+                    max_concurrency=self.jobs,
+                    retries=self.retries,
+                )
+            return self._scheduler
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.jobs, thread_name_prefix="download"
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """Wait for outstanding downloads and release the connection pool"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+                self._scheduler = None
+
+    def download_images(
+        self,
+        images: Sequence[Image],
+        directory: Path,
+        max_width: int | None = None,
+        max_height: int | None = None,
+        redownload: bool = False,
+        index: DirectoryIndex | None = None,
+        manifest: Manifest | None = None,
+        store: BlobStore | None = None,
+        variant_widths: list[int] | None = None,
+        on_image: Callable[[Image, DownloadStatus, float, int], None] | None = None,
+    ) -> DownloadSummary:
+        """Download `images` to `directory`, returning the per-image results"""
+        summary = DownloadSummary()
+        session = self.scheduler
+        if index is None:
+            index = DirectoryIndex(directory)
+        # Images are also downloaded at each of `variant_widths` narrower than
+        # they were downloaded, into a w<width> subdirectory
+        variant_indexes = {}
+        for width in variant_widths or []:
+            variant_directory = directory / Image.variant_directory(width)
+            variant_indexes[width] = DirectoryIndex(variant_directory)
+
+        def download(image: Image) -> None:
+            start = time.perf_counter()
+            size_bytes = 0
+            try:
+                status = self._download_image(
+                    image,
+                    directory,
+                    max_width=max_width,
+                    max_height=max_height,
+                    redownload=redownload,
+                    session=session,
+                    index=index,
+                    manifest=manifest,
+                    store=store,
+                )
+                variants = self._download_variants(
+                    image, directory, redownload, session, variant_indexes
+                )
+                if status == DownloadStatus.DOWNLOADED:
+                    size_bytes += image.size_bytes or 0
+                size_bytes += sum(path.stat().st_size for path in variants)
+                if variants and status == DownloadStatus.SKIPPED:
+                    status = DownloadStatus.DOWNLOADED
+            except (requests.RequestException, OSError, RuntimeError) as e:
+                logger.warning("Error downloading %s: %s", image.file_id, e)
+                status = DownloadStatus.FAILED
+                summary.record(image, status, str(e))
+            else:
+                summary.record(image, status)
+            # Called from the worker threads
+            if on_image is not None:
+                on_image(image, status, time.perf_counter() - start, size_bytes)
+
+        # Consume the iterator so worker exceptions aren't lost
+        list(self.executor.map(download, images))
+        return summary
+
+    def _download_image(
+        self,
+        image: Image,
+        directory: Path,
+        max_width: int | None,
+        max_height: int | None,
+        redownload: bool,
+        session: RequestScheduler,
+        index: DirectoryIndex,
+        manifest: Manifest | None,
+        store: BlobStore | None,
+    ) -> DownloadStatus:
+        """Get one image from wherever is cheapest: already on disk, the store, or the network"""
+        assert image.file_id
+        size = image.size_param(max_width, max_height)
+        image.downloaded_width = image.scaled_width(size)
+        force = redownload
+        # With a manifest, only images that are new or were downloaded at a
+        # different size are fetched
+        if manifest is not None and not redownload:
+            local_path = image.find_local_image(directory, index=index)
+            if not manifest.needs_download(image, size, directory, local_path):
+                # The original may have been dropped after optimizing
+                image.optimized_path = manifest.optimized_path(image, directory)
+                return DownloadStatus.SKIPPED
+            # Anything on disk is stale
+            force = True
+
+        status = DownloadStatus.DOWNLOADED
+        # Redownloading replaces what's in the store, in case it's corrupt
+        blob = store.lookup(image.file_id, size) if store and not redownload else None
+        if store and blob and (force or not image.find_local_image(directory, index)):
+            logger.debug("Linking %s from %s", image.file_id, blob)
+            image.use_file(blob, directory, store.place, index=index)
+            status = DownloadStatus.LINKED
+        else:
+            path = image.download_image(
+                directory,
+                max_width=max_width,
+                max_height=max_height,
+                redownload=force,
+                session=session,
+                index=index,
+                # Big files, like videos, are fetched as byte ranges, which
+                # count against the host's limits like any other request
+                segments=self.segments,
+            )
+            if path is None:
+                return DownloadStatus.SKIPPED
+            if store is not None:
+                store.add(
+                    path, image.file_id, size, str(image.sha256), replace=redownload
+                )
+
+        if manifest is not None:
+            assert image.relative_path and image.size_bytes is not None
+            manifest.record(
+                image, size, image.relative_path, image.size_bytes, str(image.sha256)
+            )
+        return status
+
+    @staticmethod
+    def _download_variants(
+        image: Image,
+        directory: Path,
+        redownload: bool,
+        session: RequestScheduler,
+        variant_indexes: dict[int, DirectoryIndex],
+    ) -> list[Path]:
+        """Download the variants narrower than the downloaded `image`, returning the ones written"""
+        written = []
+        full_width = image.downloaded_width or image.width
+        for width, variant_index in variant_indexes.items():
+            if full_width and width >= full_width:
+                continue
+            path = image.download_variant(
+                directory,
+                width,
+                redownload=redownload,
+                session=session,
+                index=variant_index,
+            )
+            if path:
+                written.append(path)
+        return written
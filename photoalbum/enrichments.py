@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 import typing as t
 
 
@@ -39,6 +41,9 @@ class Enrichments:
     DATA_KEY = "99218341"
     ORDERING_KEY = "101428965"  # probably
 
+    render_template = ""
+    __slots__ = ("protobuf", "ordering_str")
+
     @classmethod
     def create_enrichment(cls, enrichment: list) -> Enrichments | None:
         child_cls = cls.get_class(enrichment)
@@ -59,14 +64,17 @@ class Enrichments:
         return class_map[type_key]
 
     def __init__(self, protobuf: list) -> None:
-        self.protobuf = protobuf
+        # Only kept until parsed, unless asked for when debugging
+        self.protobuf: list | None = protobuf
         self.ordering_str: str | None = None
-        self.render_template: str = ""
 
     def __repr__(self) -> str:
-        return repr(self.protobuf)
+        if self.protobuf is not None:
+            return repr(self.protobuf)
+        return f"{type(self).__name__}(ordering_str={self.ordering_str!r})"
 
-    def parse_protobuf(self) -> None:
+    def parse_protobuf(self, keep_protobuf: bool = False) -> None:
+        """Read the fields from `protobuf`, then drop it unless `keep_protobuf`"""
         raise NotImplementedError("Implement in child class")
 
 
@@ -83,18 +91,23 @@ class Text(Enrichments):
     ]
     """
 
+    render_template = "text.html.j2"
+    __slots__ = ("text_str",)
+
     def __init__(self, *args: t.Any, **kwargs: t.Any) -> None:
         super(Text, self).__init__(*args, **kwargs)
-        self.render_template = "text.html.j2"
         self.text_str: str | None = None
 
     def __str__(self) -> str:
         return f'Text: "{self.text_str}"'
 
-    def parse_protobuf(self) -> None:
+    def parse_protobuf(self, keep_protobuf: bool = False) -> None:
+        assert self.protobuf is not None, "Already parsed"
         data_dict = self.protobuf[self.DICT_IDX]
         self.text_str = data_dict[self.DATA_KEY][0][1][0]
         self.ordering_str = data_dict[self.ORDERING_KEY][1]
+        if not keep_protobuf:
+            self.protobuf = None
 
 
 class Location(Enrichments):
@@ -131,9 +144,11 @@ class Location(Enrichments):
     ]
     """
 
+    render_template = "location.html.j2"
+    __slots__ = ("main_text", "additional_text", "lat", "lon")
+
     def __init__(self, *args: t.Any, **kwargs: t.Any) -> None:
         super(Location, self).__init__(*args, **kwargs)
-        self.render_template = "location.html.j2"
         self.main_text: str | None = None
         self.additional_text: str | None = None
         self.lat: float | None = None
@@ -142,7 +157,10 @@ class Location(Enrichments):
     def __str__(self) -> str:
         return f'Location: "{self.main_text}", "{self.additional_text}" ({self.lat},{self.lon})'
 
-    def parse_protobuf(self, protobuf_is_inner: bool = False) -> None:
+    def parse_protobuf(
+        self, keep_protobuf: bool = False, protobuf_is_inner: bool = False
+    ) -> None:
+        assert self.protobuf is not None, "Already parsed"
         if protobuf_is_inner:  # inside a Map
             inner_array = self.protobuf
         else:  # standalone
@@ -161,6 +179,8 @@ class Location(Enrichments):
         except (IndexError, TypeError):
             self.lat = None
             self.lon = None
+        if not keep_protobuf:
+            self.protobuf = None
 
 
 class Map(Enrichments):
@@ -220,21 +240,26 @@ class Map(Enrichments):
     ],
     """
 
+    render_template = "map.html.j2"
+    __slots__ = ("source_location", "destination_location")
+
     def __init__(self, *args: t.Any, **kwargs: t.Any):
         super(Map, self).__init__(*args, **kwargs)
-        self.render_template = "map.html.j2"
         self.source_location: Location | None = None
         self.destination_location: Location | None = None
 
     def __str__(self) -> str:
         return f"Map: {self.source_location} to {self.destination_location}"
 
-    def parse_protobuf(self) -> None:
+    def parse_protobuf(self, keep_protobuf: bool = False) -> None:
+        assert self.protobuf is not None, "Already parsed"
         data_dict = self.protobuf[self.DICT_IDX]
         source_protobuf = data_dict[self.DATA_KEY][0][3][3][0]
         dest_protobuf = data_dict[self.DATA_KEY][0][3][4][0]
         self.source_location = Location(source_protobuf)
-        self.source_location.parse_protobuf(protobuf_is_inner=True)
+        self.source_location.parse_protobuf(keep_protobuf, protobuf_is_inner=True)
         self.destination_location = Location(dest_protobuf)
-        self.destination_location.parse_protobuf(protobuf_is_inner=True)
+        self.destination_location.parse_protobuf(keep_protobuf, protobuf_is_inner=True)
         self.ordering_str = data_dict[self.ORDERING_KEY][1]
+        if not keep_protobuf:
+            self.protobuf = None
@@ -0,0 +1,42 @@
+import json
+import re
+
+# The album data is passed to the first script that starts with this call, eg
+# <script nonce="...">AF_initDataCallback({key: 'ds:0', hash: '1', data:[...], sideChannel: {}});</script>
+CALLBACK_REGEX = re.compile(r"<script[^>]*>AF_initDataCallback\(")
+DATA_KEY = "data:"
+
+_decoder = json.JSONDecoder()
+
+
+def extract_protobuf(page: str | bytes) -> list | None:
+    """Pull the album protobuf out of a raw album page, without parsing the HTML
+
+    Finds the AF_initDataCallback script and decodes exactly one JSON array
+    from the start of its `data:` value. Returns None if the page doesn't look
+    as expected, so the caller can fall back to a full HTML parse.
+    """
+    if isinstance(page, bytes):
+        page = page.decode("utf-8", errors="replace")
+
+    match = CALLBACK_REGEX.search(page)
+    if not match:
+        return None
+    start = match.end()
+    script_end = page.find("</script>", start)
+    if script_end == -1:
+        script_end = len(page)
+
+    # Prefer the data: value, but accept the first array in the call like the soup parser
+    data = page.find(DATA_KEY, start, script_end)
+    bracket = page.find("[", data if data != -1 else start, script_end)
+    if bracket == -1:
+        return None
+
+    try:
+        protobuf, _ = _decoder.raw_decode(page, bracket)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(protobuf, list):
+        return None
+    return protobuf
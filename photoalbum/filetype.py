@@ -0,0 +1,65 @@
+"""Work out a downloaded file's MIME type, to pick its extension"""
+
+# Content-Types that don't say what the file is
+GENERIC_TYPES = {
+    "",
+    "application/octet-stream",
+    "binary/octet-stream",
+    "application/unknown",
+}
+
+# Bytes a file starts with, for each type Google Photos serves
+MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+# ISO base media files (HEIC, AVIF, MP4, ...) have "ftyp" at byte 4, then a brand
+FTYP_BRANDS = {
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"hevc": "image/heic",
+    b"hevx": "image/heic",
+    b"heim": "image/heic",
+    b"heis": "image/heic",
+    b"mif1": "image/heif",
+    b"msf1": "image/heif",
+    b"avif": "image/avif",
+    b"avis": "image/avif",
+    b"qt  ": "video/quicktime",
+}
+
+
+def sniff_mimetype(head: bytes) -> str | None:
+    """MIME type from the first few bytes of a file, if it's a known image or video type"""
+    for magic_number, mimetype in MAGIC_NUMBERS:
+        if head.startswith(magic_number):
+            return mimetype
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        # Everything else with an ftyp box is some flavour of MP4
+        return FTYP_BRANDS.get(head[8:12], "video/mp4")
+    return None
+
+
+def guess_mimetype(content_type: str | None, head: bytes) -> str | None:
+    """MIME type of a downloaded file
+
+    Trusts the server's `content_type` if it's specific, then tries the
+    magic numbers of the types Google Photos serves against `head`, the
+    start of the file. Only then is libmagic used, if it's installed.
+    """
+    mimetype = (content_type or "").split(";")[0].strip().lower()
+    if mimetype not in GENERIC_TYPES:
+        return mimetype
+    mimetype = sniff_mimetype(head)
+    if mimetype is not None:
+        return mimetype
+    try:
+        import magic
+    except ImportError:
+        return None
+    return magic.from_buffer(head, mime=True)
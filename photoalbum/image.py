@@ -1,8 +1,26 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
 import mimetypes
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+from .directory_index import DirectoryIndex
+from .filetype import guess_mimetype
+
+# requests is only needed to download, so it's imported when used
+if TYPE_CHECKING:
+    import requests
+
+    from .scheduler import RequestScheduler
 
-import magic
-import requests
+logger = logging.getLogger(__name__)
 
 
 class Image:
@@ -78,29 +96,63 @@ class Image:
 
     ORDERING_DICT_IDX = 16
     ORDERING_KEY = "101428965"
+    CHUNK_SIZE = 1024 * 1024
+    # Smallest byte range worth its own request, when downloading in segments
+    SEGMENT_SIZE = 8 * 1024 * 1024
+    SIZE_PARAM_REGEX = re.compile(r"w(\d+)-h(\d+)")
+
+    render_template = "image.html.j2"
+
+    # Albums can have thousands of images, so skip the per-instance __dict__
+    __slots__ = (
+        "protobuf",
+        "ordering_str",
+        "base_url",
+        "width",
+        "height",
+        "file_id",
+        "relative_path",
+        "size_bytes",
+        "sha256",
+        "variants",
+        "optimized_path",
+        "downloaded_width",
+    )
 
     def __init__(self, protobuf: list):
-        self.protobuf: list = protobuf
-        self.render_template = "image.html.j2"
+        # Only kept until parsed, unless asked for when debugging
+        self.protobuf: list | None = protobuf
         self.ordering_str: str | None = None
         self.base_url: str | None = None
         self.width: int | None = None
         self.height: int | None = None
         self.file_id: Path | None = None
         self.relative_path: Path | None = None
+        self.size_bytes: int | None = None
+        self.sha256: str | None = None
+        self.variants: dict[int, Path] = {}
+        self.optimized_path: Path | None = None
+        # Width of the file downloaded, which is less than `width` if it was scaled down
+        self.downloaded_width: int | None = None
 
     def __repr__(self) -> str:
-        return repr(self.protobuf)
+        if self.protobuf is not None:
+            return repr(self.protobuf)
+        return f"{type(self).__name__}(file_id={self.file_id!r}, ordering_str={self.ordering_str!r})"
 
     def __str__(self) -> str:
         return f"Image: {self.file_id} {self.base_url} {self.width}x{self.height} path: {self.relative_path}"
 
-    def parse_protobuf(self) -> None:
+    def parse_protobuf(self, keep_protobuf: bool = False) -> None:
+        """Read the fields from `protobuf`, then drop it unless `keep_protobuf`"""
+        assert self.protobuf is not None, "Already parsed"
         self.base_url = self.protobuf[1][0]
         self.width = self.protobuf[1][1]
         self.height = self.protobuf[1][2]
         self.file_id = self.protobuf[3]
         self.ordering_str = self.protobuf[self.ORDERING_DICT_IDX][self.ORDERING_KEY][1]
+        if not keep_protobuf:
+            self.protobuf = None
 
     def download_image(
         self,
@@ -108,57 +160,474 @@ class Image:
         max_width: int | None = None,
         max_height: int | None = None,
         redownload: bool = False,
+        session: requests.Session | RequestScheduler | None = None,
+        index: DirectoryIndex | None = None,
+        segments: int = 1,
     ) -> Path | None:
-        """Download the images from base_url"""
-        # TODO videos?
-        if not self.relative_path:
-            raise ValueError("Must call find_local_image first")
+        """Download the images from base_url, returning the path written if it wasn't already there"""
         if not self.file_id:
             raise ValueError("must call parse_protobuf first")
+        if index is None:
+            index = DirectoryIndex(directory)
 
-        if self.find_local_image(directory):
+        existing = self.find_local_image(directory, index=index)
+        if existing:
             if redownload:
-                print(f"Found {directory / self.relative_path}, overwriting")
+                logger.debug("Found %s, overwriting", directory / existing)
             else:
-                print(f"Found {directory / self.relative_path}, not re-downloading")
+                logger.debug("Found %s, not re-downloading", directory / existing)
                 return None
 
-        # Construct URL
+        url = f"{self.base_url}={self.size_param(max_width, max_height)}"
+        # Files bigger than SEGMENT_SIZE, like videos, are fetched in up to
+        # `segments` byte ranges at once
+        self.relative_path, self.size_bytes, self.sha256 = self._fetch(
+            url, directory, session, segments
+        )
+        self._replace_local_file(directory, index, existing)
+        return directory / self.relative_path
+
+    def download_variant(
+        self,
+        directory: Path,
+        width: int,
+        redownload: bool = False,
+        session: requests.Session | RequestScheduler | None = None,
+        index: DirectoryIndex | None = None,
+    ) -> Path | None:
+        """Download a copy scaled to `width` into `directory`/`variant_directory(width)`
+
+        Returns the path written, or None if the variant was already there.
+        `index` is for the variant directory, not the album directory.
+        """
+        if not self.file_id:
+            raise ValueError("must call parse_protobuf first")
+        variant_directory = directory / self.variant_directory(width)
+        variant_directory.mkdir(exist_ok=True)
+        if index is None:
+            index = DirectoryIndex(variant_directory)
+
+        existing = index.get(self.file_id)
+        if existing and not redownload:
+            self.variants[width] = self.variant_directory(width) / existing
+            return None
+
+        url = f"{self.base_url}={self.size_param(max_width=width)}"
+        relative_path, _, _ = self._fetch(url, variant_directory, session)
+        if existing and existing != relative_path:
+            (variant_directory / existing).unlink(missing_ok=True)
+        index.add(self.file_id, relative_path)
+        self.variants[width] = self.variant_directory(width) / relative_path
+        return variant_directory / relative_path
+
+    @staticmethod
+    def variant_directory(width: int) -> Path:
+        """Subdirectory of the album holding variants `width` pixels wide"""
+        return Path(f"w{width}")
+
+    @property
+    def src(self) -> Path | None:
+        """File to show in the HTML: the optimized copy if there is one, otherwise the original"""
+        return self.optimized_path or self.relative_path
+
+    @property
+    def srcset(self) -> str:
+        """`srcset` attribute listing the variants and the image at the width it was downloaded"""
+        candidates = [
+            f"{path} {width}w" for width, path in sorted(self.variants.items())
+        ]
+        width = self.downloaded_width or self.width
+        if self.src and width:
+            candidates.append(f"{self.src} {width}w")
+        return ", ".join(candidates)
+
+    def use_file(
+        self,
+        source: Path,
+        directory: Path,
+        place: Callable[[Path, Path], None],
+        index: DirectoryIndex | None = None,
+    ) -> Path:
+        """Use `source` as the image instead of downloading it
+
+        `source` should be named `<sha256><ext>`, as in a BlobStore. `place`
+        puts it into `directory`, eg as a hardlink.
+        """
+        if not self.file_id:
+            raise ValueError("must call parse_protobuf first")
+        if index is None:
+            index = DirectoryIndex(directory)
+        existing = self.find_local_image(directory, index=index)
+        self.relative_path = Path(self.file_id).with_suffix(source.suffix)
+        write_path = directory / self.relative_path
+        place(source, write_path)
+        self.size_bytes = write_path.stat().st_size
+        self.sha256 = source.name.partition(".")[0]
+        self._replace_local_file(directory, index, existing)
+        return write_path
+
+    def _replace_local_file(
+        self, directory: Path, index: DirectoryIndex, previous: Path | None
+    ) -> None:
+        """Record the new `relative_path`, removing the previous file if the extension changed"""
+        assert self.file_id and self.relative_path
+        if previous and previous != self.relative_path:
+            (directory / previous).unlink(missing_ok=True)
+        index.add(self.file_id, self.relative_path)
+
+    def size_param(
+        self, max_width: int | None = None, max_height: int | None = None
+    ) -> str:
+        """The base_url parameter requesting this size, or the original"""
         if max_width or max_height:
             max_width = max_width or self.width
             max_height = max_height or self.height
-            url = f"{self.base_url}=w{max_width}-h{max_height}"
+            return f"w{max_width}-h{max_height}"
+        return "d"
+
+    def scaled_width(self, size: str) -> int | None:
+        """Width of the image downloaded with `size`, a size_param
+
+        The server scales the image down to fit, keeping its aspect ratio.
+        """
+        match = self.SIZE_PARAM_REGEX.fullmatch(size)
+        if not match or not self.width or not self.height:
+            return self.width
+        scale = min(1, int(match[1]) / self.width, int(match[2]) / self.height)
+        return round(self.width * scale)
+
+    @property
+    def partial_path(self) -> Path:
+        """Where the image is written while downloading. Hidden so it's never mistaken for the image"""
+        return Path(f".{self.file_id}.part")
+
+    @property
+    def validators_path(self) -> Path:
+        """Validators for `partial_path`, needed to resume it with a Range request"""
+        return Path(f".{self.file_id}.part.json")
+
+    def _fetch(
+        self,
+        url: str,
+        directory: Path,
+        session: requests.Session | RequestScheduler | None,
+        segments: int = 1,
+    ) -> tuple[Path, int, str]:
+        """Download `url` to `<file_id><ext>` in `directory`, returning its name, size and SHA-256"""
+        logger.debug("Downloading file from %s", url)
+        import requests
+
+        # Resume a partial download left by an earlier run if the server still
+        # has the same file, otherwise maybe split it into ranges
+        headers = self._resume_headers(url, directory)
+        if segments > 1 and not headers:
+            return self._fetch_segments(url, directory, session, segments)
+        while True:
+            with (session or requests).get(
+                url, stream=True, headers=headers
+            ) as response:
+                if response.status_code == 416 and headers:
+                    # Partial file is no good, eg it's already longer than the file
+                    logger.info("Can't resume %s, starting again", url)
+                    self._discard_partial(directory)
+                    headers = {}
+                    continue
+                if response.status_code not in (200, 206):
+                    raise RuntimeError(f"Error fetching {url}: {response.status_code}")
+                return self._write_response(response, directory, url)
+
+    def _fetch_segments(
+        self,
+        url: str,
+        directory: Path,
+        session: requests.Session | RequestScheduler | None,
+        segments: int,
+    ) -> tuple[Path, int, str]:
+        """Download `url` in byte ranges, up to `segments` at a time"""
+        import requests
+
+        get = (session or requests).get
+        partial_path = directory / self.partial_path
+        # The first range's response says how big the file is, and the rest is
+        # split between `segments` more requests. If the server ignores
+        # ranges, the whole file comes back and is downloaded as usual.
+        with get(
+            url, stream=True, headers={"Range": f"bytes=0-{self.SEGMENT_SIZE - 1}"}
+        ) as response:
+            if response.status_code == 200:
+                return self._write_response(response, directory, url)
+            if response.status_code != 206:
+                raise RuntimeError(f"Error fetching {url}: {response.status_code}")
+            content_range = response.headers.get("Content-Range", "")
+            try:
+                total = int(content_range.rpartition("/")[2])
+            except ValueError:
+                raise RuntimeError(
+                    f"Error fetching {url}: unexpected range {content_range!r}"
+                ) from None
+            content_type = response.headers.get("Content-Type")
+            # Make sure every range is from the same version of the file
+            etag = response.headers.get("ETag")
+            validator = etag if etag and not etag.startswith("W/") else None
+            validator = validator or response.headers.get("Last-Modified")
+
+            remaining = total - self.SEGMENT_SIZE
+            size = max(self.SEGMENT_SIZE, -(-remaining // segments))
+            ranges = [
+                (start, min(start + size, total) - 1)
+                for start in range(self.SEGMENT_SIZE, total, size)
+            ]
+            if ranges and not validator:
+                raise RuntimeError(
+                    f"Error fetching {url}: no ETag or Last-Modified to download it in segments"
+                )
+            logger.debug("Downloading %s in %d segments", url, len(ranges) + 1)
+
+            # Each range is streamed straight to its place in the file, so
+            # memory use doesn't grow with the file
+            self._discard_partial(directory)
+            try:
+                with partial_path.open("wb") as f:
+                    f.truncate(total)
+                # Finish the first range before starting the others. With a
+                # RequestScheduler, its response holds one of the host's
+                # slots, which the others might need.
+                self._write_range(
+                    response,
+                    partial_path,
+                    0,
+                    min(total, self.SEGMENT_SIZE),
+                    threading.Event(),
+                )
+            except BaseException:
+                partial_path.unlink(missing_ok=True)
+                raise
+
+        failed = threading.Event()
+        try:
+            if ranges:
+                assert validator
+                with ThreadPoolExecutor(
+                    max_workers=segments, thread_name_prefix="segment"
+                ) as executor:
+                    futures = [
+                        executor.submit(
+                            self._fetch_range,
+                            get,
+                            url,
+                            partial_path,
+                            start,
+                            end,
+                            validator,
+                            failed,
+                        )
+                        for start, end in ranges
+                    ]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except BaseException:
+                        # Stop the other segments early
+                        failed.set()
+                        raise
+            return self._finish_segments(content_type, directory)
+        except BaseException:
+            # Segmented downloads aren't resumed
+            partial_path.unlink(missing_ok=True)
+            raise
+
+    def _fetch_range(
+        self,
+        get: Callable,
+        url: str,
+        partial_path: Path,
+        start: int,
+        end: int,
+        validator: str,
+        failed: threading.Event,
+    ) -> None:
+        """Download bytes `start` to `end` of `url` into the same place in `partial_path`"""
+        headers = {"Range": f"bytes={start}-{end}", "If-Range": validator}
+        with get(url, stream=True, headers=headers) as response:
+            content_range = response.headers.get("Content-Range", "")
+            if response.status_code != 206 or not content_range.startswith(
+                f"bytes {start}-{end}/"
+            ):
+                raise RuntimeError(
+                    f"Error fetching {url}: file changed while downloading"
+                )
+            self._write_range(response, partial_path, start, end - start + 1, failed)
+
+    def _write_range(
+        self,
+        response: requests.Response,
+        partial_path: Path,
+        offset: int,
+        length: int,
+        failed: threading.Event,
+    ) -> None:
+        written = 0
+        with partial_path.open("r+b") as f:
+            f.seek(offset)
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                if failed.is_set():
+                    raise RuntimeError("Another segment failed")
+                f.write(chunk)
+                written += len(chunk)
+        if written != length:
+            raise RuntimeError(
+                f"Error fetching {response.url}: got {written} of {length} bytes at {offset}"
+            )
+
+    def _finish_segments(
+        self, content_type: str | None, directory: Path
+    ) -> tuple[Path, int, str]:
+        """Hash the completed `partial_path`, then rename it to `<file_id><ext>`"""
+        partial_path = directory / self.partial_path
+        sha256 = hashlib.sha256()
+        size_bytes = 0
+        head = b""
+        with partial_path.open("rb") as f:
+            while chunk := f.read(self.CHUNK_SIZE):
+                head = head or chunk
+                sha256.update(chunk)
+                size_bytes += len(chunk)
+        mimetype = guess_mimetype(content_type, head)
+        extension = mimetypes.guess_extension(mimetype or "") or ""
+        relative_path = Path(str(self.file_id)).with_suffix(extension)
+        write_path = directory / relative_path
+        logger.debug("Writing file to %s", write_path)
+        os.replace(partial_path, write_path)
+        return relative_path, size_bytes, sha256.hexdigest()
+
+    def _resume_headers(self, url: str, directory: Path) -> dict[str, str]:
+        """Range headers to resume the partial download of `url`, if there is one"""
+        partial_path = directory / self.partial_path
+        try:
+            with (directory / self.validators_path).open("r") as f:
+                validators = json.load(f)
+            offset = partial_path.stat().st_size
+        except (FileNotFoundError, ValueError):
+            self._discard_partial(directory)
+            return {}
+        length = validators.get("length")
+        if validators.get("url") != url or not offset:
+            self._discard_partial(directory)
+            return {}
+        if length and offset >= int(length):
+            self._discard_partial(directory)
+            return {}
+        # If-Range needs a strong ETag, otherwise use the date
+        etag = validators.get("etag")
+        validator = etag if etag and not etag.startswith("W/") else None
+        validator = validator or validators.get("last_modified")
+        if not validator:
+            self._discard_partial(directory)
+            return {}
+        logger.info("Resuming %s from byte %d", url, offset)
+        return {"Range": f"bytes={offset}-", "If-Range": validator}
+
+    def _discard_partial(self, directory: Path) -> None:
+        (directory / self.partial_path).unlink(missing_ok=True)
+        (directory / self.validators_path).unlink(missing_ok=True)
+
+    def _write_response(
+        self, response: requests.Response, directory: Path, url: str
+    ) -> tuple[Path, int, str]:
+        """Stream the body to `partial_path`, then rename it to `<file_id><ext>`"""
+        partial_path = directory / self.partial_path
+        validators_path = directory / self.validators_path
+        sha256 = hashlib.sha256()
+        size_bytes = 0
+        head = b""
+        mode = "wb"
+        # A 206 continues the partial file. Anything else means the server
+        # ignored the range or the file changed, so start again.
+        if response.status_code == 206:
+            offset = partial_path.stat().st_size
+            content_range = response.headers.get("Content-Range", "")
+            if not content_range.startswith(f"bytes {offset}-"):
+                self._discard_partial(directory)
+                raise RuntimeError(
+                    f"Error fetching {url}: unexpected range {content_range!r}"
+                )
+            mode = "ab"
+            with partial_path.open("rb") as f:
+                while chunk := f.read(self.CHUNK_SIZE):
+                    head = head or chunk
+                    sha256.update(chunk)
+                    size_bytes += len(chunk)
         else:
-            url = f"{self.base_url}=d"
+            self._discard_partial(directory)
+            self._write_validators(validators_path, url, response)
 
-        # Get
-        print(f"Downloading file from {url}")
-        response = requests.get(url)
-        if response.status_code != 200:
-            print(f"Error fetching {url}: {response.status_code}")
-            return None
+        content_type = response.headers.get("Content-Type")
+        mimetype = guess_mimetype(content_type, head) if head else None
+        try:
+            with partial_path.open(mode) as f:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    if mimetype is None:
+                        mimetype = guess_mimetype(content_type, chunk)
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    size_bytes += len(chunk)
 
-        # Guess extension
-        mimetype = magic.from_buffer(response.content, mime=True)
-        extension = mimetypes.guess_extension(mimetype) or ""
-        self.relative_path = Path(self.file_id).with_suffix(extension)
+            extension = mimetypes.guess_extension(mimetype or "") or ""
+            relative_path = Path(str(self.file_id)).with_suffix(extension)
+            write_path = directory / relative_path
+            logger.debug("Writing file to %s", write_path)
+            os.replace(partial_path, write_path)
+        except BaseException:
+            # Keep the partial file to resume later, if the server sent
+            # validators to check it against
+            if not validators_path.exists():
+                partial_path.unlink(missing_ok=True)
+            raise
+        validators_path.unlink(missing_ok=True)
+        return relative_path, size_bytes, sha256.hexdigest()
 
-        # Write
-        write_path = directory / self.relative_path
-        print(f"Writing file to {write_path}")
-        write_path.write_bytes(response.content)
-        return write_path
+    @staticmethod
+    def _write_validators(path: Path, url: str, response: requests.Response) -> None:
+        """Record what's needed to resume the download of `response` later"""
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.headers.get("Accept-Ranges") == "none":
+            return
+        if not etag and not last_modified:
+            return
+        validators = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "length": response.headers.get("Content-Length"),
+        }
+        with path.open("w") as f:
+            json.dump(validators, f)
 
-    def find_local_image(self, directory: Path) -> Path | None:
-        """Check `directory` for the image"""
+    def find_local_image(
+        self, directory: Path, index: DirectoryIndex | None = None
+    ) -> Path | None:
+        """Check `directory` for the image, using `index` if it's already been scanned"""
         if not self.file_id:
             raise ValueError("must call parse_protobuf first")
-        matches = list(directory.glob(f"{self.file_id}.*"))
-        if len(matches) == 0:
-            print(f"No file found for {directory / self.file_id}.*")
+        if index is None:
+            index = DirectoryIndex(directory)
+        match = index.get(self.file_id)
+        if match is None:
+            logger.debug("No file found for %s.*", directory / self.file_id)
             return None
-        elif len(matches) > 1:
-            raise RuntimeError(f"Multiple files found for {directory / self.file_id}.*")
-        self.relative_path = matches[0].relative_to(directory)
-        print(f"Found {self.relative_path}")
+        self.relative_path = match
+        logger.debug("Found %s", self.relative_path)
         return self.relative_path
+
+    def find_local_variants(
+        self, variant_indexes: dict[int, DirectoryIndex]
+    ) -> dict[int, Path]:
+        """Check each variant directory, indexed by width, for the image"""
+        if not self.file_id:
+            raise ValueError("must call parse_protobuf first")
+        for width, index in variant_indexes.items():
+            match = index.get(self.file_id)
+            if match:
+                self.variants[width] = self.variant_directory(width) / match
+        return self.variants
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Sequence
+
+from .atomic import write_atomic
+from .image import Image
+
+logger = logging.getLogger(__name__)
+
+
+class Manifest:
+    """Record of the image files downloaded for an album, kept next to the HTML
+
+    Lets a re-run skip images that are already there at the requested size,
+    and spot images that have been removed from the album.
+
+    {
+        "<file_id>": {
+            "path": "<file_id>.jpg",
+            "size": "d", # size parameter requested, eg "d" or "w800-h600"
+            "bytes": 123456,
+            "sha256": "<hex digest of the file>",
+            "ordering_str": "vdh9cohf070000000000004k",
+            "base_url": "https://lh3.googleusercontent.com/...",
+            "optimized": { # if it's been through an Optimizer
+                "path": "optimized/<file_id>.webp",
+                "bytes": 23456,
+                "settings": {"format": "webp", "quality": 80, "strip_metadata": false},
+                "source_sha256": "<sha256 of the original it was made from>",
+                "original_dropped": false
+            }
+        }
+    }
+    """
+
+    FILENAME = "manifest.json"
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self.entries
+
+    @classmethod
+    def load(cls, path: Path) -> "Manifest":
+        """Read the manifest at `path`, or start an empty one if there isn't a readable one"""
+        manifest = cls(path)
+        try:
+            with path.open("r") as f:
+                manifest.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError as e:
+            # Files already downloaded are adopted again as they're seen
+            logger.warning("Can't read %s, starting a new manifest: %s", path, e)
+        return manifest
+
+    def save(self) -> None:
+        """Write the manifest, replacing the old one atomically"""
+        with self._lock:
+            content = json.dumps(self.entries, indent=1, sort_keys=True)
+        write_atomic(self.path, content.encode())
+
+    def needs_download(
+        self, image: Image, size: str, directory: Path, local_path: Path | None
+    ) -> bool:
+        """Whether `image` must be fetched to have it at `size` in `directory`
+
+        `local_path` is the image's existing file, if any. A file that's on
+        disk but not in the manifest (eg from before there was a manifest) is
+        assumed to be at the requested size and adopted rather than fetched.
+        An image whose original was dropped after optimizing isn't fetched
+        again while its optimized file is there.
+        """
+        entry = self.entries.get(str(image.file_id))
+        if local_path is None:
+            optimized = entry.get("optimized") if entry else None
+            return not (
+                entry
+                and optimized
+                and optimized["original_dropped"]
+                and entry["size"] == size
+                and (directory / optimized["path"]).exists()
+            )
+        if entry is None:
+            self._adopt(image, size, directory, local_path)
+            return False
+        if entry["size"] != size or entry["path"] != str(local_path):
+            return True
+        try:
+            on_disk = (directory / local_path).stat().st_size
+        except FileNotFoundError:
+            return True
+        if on_disk != entry["bytes"]:
+            return True
+        self.update_seen(image)
+        return False
+
+    def _adopt(
+        self, image: Image, size: str, directory: Path, local_path: Path
+    ) -> None:
+        sha256 = hashlib.sha256()
+        size_bytes = 0
+        with (directory / local_path).open("rb") as f:
+            while chunk := f.read(Image.CHUNK_SIZE):
+                sha256.update(chunk)
+                size_bytes += len(chunk)
+        self.record(image, size, local_path, size_bytes, sha256.hexdigest())
+
+    def record(
+        self, image: Image, size: str, path: Path, size_bytes: int, sha256: str
+    ) -> None:
+        """Record that `image` was written to `path`"""
+        with self._lock:
+            self.entries[str(image.file_id)] = {
+                "path": str(path),
+                "size": size,
+                "bytes": size_bytes,
+                "sha256": sha256,
+                "ordering_str": image.ordering_str,
+                "base_url": image.base_url,
+            }
+
+    def record_optimized(self, image: Image, optimized: dict) -> None:
+        """Record the optimized copy of an image that's already recorded"""
+        with self._lock:
+            self.entries[str(image.file_id)]["optimized"] = optimized
+
+    def optimized_path(self, image: Image, directory: Path) -> Path | None:
+        """The optimized copy of `image` recorded in the manifest, if it's in `directory`"""
+        entry = self.entries.get(str(image.file_id))
+        optimized = entry.get("optimized") if entry else None
+        if optimized and (directory / optimized["path"]).exists():
+            return Path(optimized["path"])
+        return None
+
+    def update_seen(self, image: Image) -> None:
+        """Update the ordering and URL last seen for an image that's already recorded"""
+        with self._lock:
+            entry = self.entries[str(image.file_id)]
+            entry["ordering_str"] = image.ordering_str
+            entry["base_url"] = image.base_url
+
+    def remove(self, file_id: str) -> dict | None:
+        with self._lock:
+            return self.entries.pop(file_id, None)
+
+    def missing_from(self, images: Sequence[Image]) -> list[str]:
+        """file_ids in the manifest that aren't in `images` any more"""
+        current = {str(image.file_id) for image in images}
+        return sorted(set(self.entries) - current)
@@ -0,0 +1,74 @@
+"""Map views for the HTML, embedded as JSON that album.js draws from
+
+Each view is a dict like
+
+    {
+        "markers": [[<lat>, <lon>], ...],
+        "lines": [[[<lat>, <lon>], [<lat>, <lon>]], ...], # optional
+        "zoom": 14, # optional, centred on the first marker, otherwise fitted to the markers
+        "cluster": true # optional, group markers that are close together
+    }
+"""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+from .enrichments import Enrichments, Location, Map
+from .image import Image
+from .tiles import LOCATION_ZOOM
+
+# Decimal places kept in coordinates, as many as Google Photos gives
+COORDINATE_DIGITS = 7
+
+
+def _point(location: Location | None) -> list[float] | None:
+    if location is None or location.lat is None or location.lon is None:
+        return None
+    return [
+        round(location.lat, COORDINATE_DIGITS),
+        round(location.lon, COORDINATE_DIGITS),
+    ]
+
+
+def map_view(item: Enrichments | Image) -> dict | None:
+    """The view for a Location or Map item, or None if it doesn't have one"""
+    if isinstance(item, Location):
+        # location.html.j2 only shows a map if both are set
+        if not (item.lat and item.lon):
+            return None
+        return {"markers": [_point(item)], "zoom": LOCATION_ZOOM}
+    if isinstance(item, Map):
+        source = _point(item.source_location)
+        destination = _point(item.destination_location)
+        if source is None or destination is None:
+            return None
+        return {"markers": [source, destination], "lines": [[source, destination]]}
+    return None
+
+
+def page_maps(items: Sequence[Enrichments | Image]) -> dict[str, dict]:
+    """Views for the maps among a page's `items`, keyed by their position on the page"""
+    views = {}
+    for index, item in enumerate(items):
+        view = map_view(item)
+        if view is not None:
+            views[str(index)] = view
+    return views
+
+
+def overview_map(items: Sequence[Enrichments | Image]) -> dict | None:
+    """One view of every place in `items`, with clustered markers
+
+    None if there aren't any places.
+    """
+    markers = []
+    lines = []
+    for item in items:
+        view = map_view(item)
+        if view is not None:
+            markers += view["markers"]
+            lines += view.get("lines", [])
+    if not markers:
+        return None
+    return {"markers": markers, "lines": lines, "cluster": True}
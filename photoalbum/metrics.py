@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .album import Album
+    from .downloader import DownloadStatus
+    from .image import Image
+
+
+class AlbumHooks:
+    """Callbacks for following an Album's progress
+
+    Subclass this, override the methods wanted, and add an instance to
+    `Album.hooks`. Images are downloaded on worker threads, so
+    `image_finished` can be called from several threads at once.
+
+    Phases are "fetch", "extract", "load", "parse", "scan", "download",
+    "optimize", "tiles" and "render".
+    """
+
+    def phase_started(self, album: Album, phase: str) -> None:
+        pass
+
+    def phase_finished(self, album: Album, phase: str, seconds: float) -> None:
+        pass
+
+    def image_finished(
+        self,
+        album: Album,
+        image: Image,
+        status: DownloadStatus,
+        seconds: float,
+        size_bytes: int,
+    ) -> None:
+        """Called once per image with its result, how long it took and the bytes downloaded"""
+        pass
+
+
+def percentile(values: list[float], percent: float) -> float | None:
+    """Nearest-rank percentile of `values`"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class Metrics(AlbumHooks):
+    """Time each phase and collect download statistics, for a run report"""
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+        self.statuses: Counter[str] = Counter()
+        self.latencies: list[float] = []
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+    def phase_finished(self, album: Album, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def image_finished(
+        self,
+        album: Album,
+        image: Image,
+        status: DownloadStatus,
+        seconds: float,
+        size_bytes: int,
+    ) -> None:
+        with self._lock:
+            self.statuses[status.value] += 1
+            self.bytes_downloaded += size_bytes
+            if size_bytes:
+                self.latencies.append(seconds)
+
+    def report(self) -> dict:
+        """Phase timings and download statistics, ready to write as JSON"""
+        with self._lock:
+            download_seconds = self.phases.get("download", 0.0)
+            fetched = len(self.latencies)
+            return {
+                "phases": {
+                    phase: round(seconds, 6) for phase, seconds in self.phases.items()
+                },
+                "downloads": {
+                    "images": sum(self.statuses.values()),
+                    "statuses": dict(self.statuses),
+                    "bytes": self.bytes_downloaded,
+                    "images_per_second": (
+                        fetched / download_seconds if download_seconds else None
+                    ),
+                    "bytes_per_second": (
+                        self.bytes_downloaded / download_seconds
+                        if download_seconds
+                        else None
+                    ),
+                    "latency_seconds": {
+                        "p50": percentile(self.latencies, 50),
+                        "p90": percentile(self.latencies, 90),
+                        "p99": percentile(self.latencies, 99),
+                        "max": max(self.latencies, default=None),
+                    },
+                },
+            }
+
+
+def write_report(path: Path, albums: list[dict], seconds: float) -> None:
+    """Write the report for a run covering `albums` to `path` as JSON"""
+    with path.open("w") as f:
+        json.dump({"seconds": round(seconds, 6), "albums": albums}, f, indent=2)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Sequence
+
+if TYPE_CHECKING:
+    from .image import Image
+    from .manifest import Manifest
+
+logger = logging.getLogger(__name__)
+
+OPTIMIZED_DIRECTORY = Path("optimized")
+# Pillow format name and file extension for each output format
+FORMATS = {
+    "webp": ("WEBP", ".webp"),
+    "avif": ("AVIF", ".avif"),
+    "jpeg": ("JPEG", ".jpg"),
+}
+
+
+def optimize_file(
+    source: str, destination: str, format: str, quality: int, strip_metadata: bool
+) -> int:
+    """Re-encode the image at `source` as `format` at `destination`, returning its size
+
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    from PIL import Image as PILImage
+    from PIL import ImageOps
+
+    try:
+        import pillow_heif
+
+        pillow_heif.register_heif_opener()
+    except ImportError:
+        pass
+
+    pillow_format, _ = FORMATS[format]
+    temp = Path(destination).with_name(f".{Path(destination).name}.tmp")
+    with PILImage.open(source) as original:
+        options: dict = {"quality": quality}
+        if "icc_profile" in original.info:
+            # Keep the colour profile even without the rest of the metadata
+            options["icc_profile"] = original.info["icc_profile"]
+        image = original
+        if strip_metadata:
+            # The EXIF orientation is dropped, so apply it to the pixels
+            image = ImageOps.exif_transpose(original)
+        else:
+            options["exif"] = original.getexif().tobytes()
+        if pillow_format == "JPEG":
+            options.update(optimize=True, progressive=True)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+        try:
+            image.save(temp, format=pillow_format, **options)
+            os.replace(temp, destination)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+    return os.stat(destination).st_size
+
+
+class Optimizer:
+    """Re-encode downloaded images smaller, using every core
+
+    Outputs go in the album's `optimized` directory and are recorded in the
+    manifest, with the settings and the hash of the original they came
+    from, so re-runs skip images that are already done. Without
+    `keep_originals`, the original is deleted once it's been optimized.
+    Needs Pillow, and pillow-heif for HEIC originals.
+    """
+
+    def __init__(
+        self,
+        format: str = "webp",
+        quality: int = 80,
+        strip_metadata: bool = False,
+        keep_originals: bool = True,
+        jobs: int | None = None,
+    ) -> None:
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        if importlib.util.find_spec("PIL") is None:
+            raise RuntimeError("Optimizing images needs Pillow installed")
+        self.format = format
+        self.quality = quality
+        self.strip_metadata = strip_metadata
+        self.keep_originals = keep_originals
+        self.jobs = jobs or os.cpu_count() or 1
+
+    @property
+    def settings(self) -> dict:
+        return {
+            "format": self.format,
+            "quality": self.quality,
+            "strip_metadata": self.strip_metadata,
+        }
+
+    def output_path(self, image: Image) -> Path:
+        return OPTIMIZED_DIRECTORY / f"{image.file_id}{FORMATS[self.format][1]}"
+
+    def is_current(self, entry: dict, directory: Path) -> bool:
+        """Whether the output recorded in manifest `entry` matches its original and these settings"""
+        optimized = entry.get("optimized")
+        return bool(
+            optimized
+            and optimized["settings"] == self.settings
+            and optimized["source_sha256"] == entry["sha256"]
+            and (directory / optimized["path"]).exists()
+        )
+
+    def optimize_images(
+        self, images: Sequence[Image], directory: Path, manifest: Manifest
+    ) -> list[Path]:
+        """Optimize the downloaded `images` in `directory`, returning the files written
+
+        Sets each image's `optimized_path`, including ones already done.
+        Images that aren't in `manifest` aren't touched.
+        """
+        from .video import Video
+
+        (directory / OPTIMIZED_DIRECTORY).mkdir(exist_ok=True)
+        jobs: dict[Future, tuple[Image, dict]] = {}
+        written = []
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            for image in images:
+                entry = manifest.entries.get(str(image.file_id))
+                if isinstance(image, Video) or entry is None:
+                    continue
+                if self.is_current(entry, directory):
+                    image.optimized_path = Path(entry["optimized"]["path"])
+                    continue
+                if image.relative_path is None:
+                    # The original was dropped, so keep what was made from it
+                    image.optimized_path = manifest.optimized_path(image, directory)
+                    continue
+                output = self.output_path(image)
+                future = executor.submit(
+                    optimize_file,
+                    str(directory / image.relative_path),
+                    str(directory / output),
+                    self.format,
+                    self.quality,
+                    self.strip_metadata,
+                )
+                jobs[future] = (image, entry)
+
+            for future, (image, entry) in jobs.items():
+                try:
+                    size_bytes = future.result()
+                except Exception as e:
+                    logger.warning("Error optimizing %s: %s", image.relative_path, e)
+                    continue
+                output = self.output_path(image)
+                previous = entry.get("optimized")
+                if previous and previous["path"] != str(output):
+                    (directory / previous["path"]).unlink(missing_ok=True)
+                logger.debug(
+                    "Optimized %s to %s, %d bytes from %d",
+                    image.relative_path,
+                    output,
+                    size_bytes,
+                    entry["bytes"],
+                )
+                manifest.record_optimized(
+                    image,
+                    {
+                        "path": str(output),
+                        "bytes": size_bytes,
+                        "settings": self.settings,
+                        "source_sha256": entry["sha256"],
+                        "original_dropped": not self.keep_originals,
+                    },
+                )
+                image.optimized_path = output
+                written.append(directory / output)
+                if not self.keep_originals:
+                    assert image.relative_path
+                    (directory / image.relative_path).unlink(missing_ok=True)
+        logger.info("Optimized %d images in %s", len(written), directory)
+        return written
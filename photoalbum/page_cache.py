@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+from . import snapshot
+from .atomic import write_atomic
+from .cache import entries_to_evict, mark_used
+
+logger = logging.getLogger(__name__)
+
+# Entries are named after a hash of their URL, as written by PageCache._paths
+ENTRY_NAME = re.compile(r"([0-9a-f]{32})\.(json|pb)")
+
+
+class PageCache:
+    """Disk cache of album pages, shared between runs and albums
+
+    Rather than the page itself, each album URL's entry keeps what's needed
+    to revalidate it and to skip extracting it again:
+
+        <directory>/<URL hash>.json: {"url": ..., "validators": {...}, "validated": <time>}
+        <directory>/<URL hash>.pb: the protobuf extracted from the page, in the compact format
+
+    `validators` are the ETag, Last-Modified and SHA-256 of the page, as in
+    `Album.validators`. Entries that haven't been validated for `max_age`
+    seconds aren't used. Once the cache is larger than `max_bytes`, the
+    least recently used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = 100 * 1024 * 1024,
+        max_age: float | None = 7 * 24 * 60 * 60,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode()).hexdigest()[:32]
+        return self.directory / f"{key}.json", self.directory / f"{key}.pb"
+
+    def get(self, url: str) -> dict[str, str] | None:
+        """Validators for the page at `url`, if it's cached and not too old"""
+        entry_path, protobuf_path = self._paths(url)
+        try:
+            with entry_path.open("r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry["url"] != url or not protobuf_path.exists():
+            return None
+        if self.max_age is not None and time.time() - entry["validated"] > self.max_age:
+            logger.debug("Cached page for %s is too old", url)
+            return None
+        validators: dict[str, str] = entry["validators"]
+        return validators
+
+    def load(self, url: str) -> list:
+        """The protobuf cached for `url`. Check it's there with `get` first"""
+        _, protobuf_path = self._paths(url)
+        mark_used(protobuf_path)
+        return snapshot.read_protobuf(protobuf_path)
+
+    def remove(self, url: str) -> None:
+        for path in self._paths(url):
+            path.unlink(missing_ok=True)
+
+    def store(
+        self, url: str, validators: dict[str, str], protobuf: list | None = None
+    ) -> None:
+        """Cache `validators` for `url`, and the protobuf from its page if it's changed
+
+        Without `protobuf`, the page was revalidated, so the cached one is kept.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry_path, protobuf_path = self._paths(url)
+        if protobuf is not None:
+            snapshot.write_protobuf(protobuf, protobuf_path, compact=True)
+        entry = {"url": url, "validators": validators, "validated": time.time()}
+        write_atomic(entry_path, json.dumps(entry).encode())
+
+    def evict(self) -> list[str]:
+        """Delete expired entries, then the least recently used until the cache fits in `max_bytes`
+
+        Only files named like entries are looked at, so anything else in the
+        directory is left alone. Returns the URL hashes of the entries deleted.
+        """
+        stats: dict[str, dict[str, os.stat_result]] = {}
+        try:
+            with os.scandir(self.directory) as scan:
+                for file in scan:
+                    match = ENTRY_NAME.fullmatch(file.name)
+                    if match and file.is_file():
+                        key, suffix = match.groups()
+                        stats.setdefault(key, {})[suffix] = file.stat()
+        except FileNotFoundError:
+            return []
+
+        now = time.time()
+        entries = []
+        for key, files in stats.items():
+            size = sum(stat.st_size for stat in files.values())
+            # The entry is rewritten each time the page is validated
+            validated = files["json"].st_mtime if "json" in files else 0.0
+            complete = len(files) == 2
+            too_old = self.max_age is not None and now - validated > self.max_age
+            last_used = max(stat.st_mtime for stat in files.values())
+            entries.append((not complete or too_old, last_used, size, key))
+
+        evicted = entries_to_evict(entries, self.max_bytes)
+        for key in evicted:
+            for suffix in (".json", ".pb"):
+                (self.directory / f"{key}{suffix}").unlink(missing_ok=True)
+        if evicted:
+            logger.info("Evicted %d pages from %s", len(evicted), self.directory)
+        return evicted
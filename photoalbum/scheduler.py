@@ -0,0 +1,197 @@
+import contextlib
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Iterator
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(RuntimeError):
+    """A request that still failed after all its retries"""
+
+
+class TokenBucket:
+    """Allow `rate` requests a second on average, in bursts of up to `burst`"""
+
+    def __init__(self, rate: float | None, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for `seconds`, eg for a Retry-After"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def acquire(self) -> None:
+        """Wait for a token"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0 and self.rate is None:
+                    return
+                if wait <= 0 and self.rate is not None:
+                    elapsed = now - self.updated
+                    self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ConcurrencyLimit:
+    """Cap on requests in flight to a host, adapted to how the host responds
+
+    Halves when the host throttles, and grows by one after a run of successes
+    (additive increase, multiplicative decrease), up to `maximum`.
+    """
+
+    def __init__(self, maximum: int) -> None:
+        self.maximum = maximum
+        self.limit = maximum
+        self.in_flight = 0
+        self.successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def throttled(self) -> None:
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+
+    def succeeded(self) -> None:
+        with self._condition:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.successes = 0
+                self._condition.notify()
+
+
+class RequestScheduler:
+    """Send GET requests through per-host rate and concurrency limits, with retries
+
+    Connection errors, timeouts, 429s and 5xx responses are retried with
+    jittered exponential backoff, or after the Retry-After the server asked
+    for. Throttling responses (429, 503) also halve that host's concurrency.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    THROTTLE_STATUSES = {429, 503}
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        rate: float | None = None,
+        burst: int = 1,
+        max_concurrency: int = 4,
+        retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        timeout: float = 60.0,
+    ) -> None:
+        self.session = session or requests.Session()
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._buckets: dict[str, TokenBucket] = {}
+        self._limits: dict[str, ConcurrencyLimit] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url: str) -> tuple[TokenBucket, ConcurrencyLimit]:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+                self._limits[host] = ConcurrencyLimit(self.max_concurrency)
+            return self._buckets[host], self._limits[host]
+
+    def _delay(self, attempt: int, response: requests.Response | None) -> float:
+        """How long to wait before retrying, at most `max_backoff`"""
+        if response is not None and "Retry-After" in response.headers:
+            retry_after = response.headers["Retry-After"]
+            delay = None
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    when = email.utils.parsedate_to_datetime(retry_after)
+                    delay = when.timestamp() - time.time()
+                except (TypeError, ValueError):
+                    pass
+            if delay is not None:
+                # Don't let a server stall the whole download indefinitely
+                return min(self.max_backoff, max(0.0, delay))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    @contextlib.contextmanager
+    def get(self, url: str, **kwargs: object) -> Iterator[requests.Response]:
+        """GET `url`, retrying as needed, for use in a with statement"""
+        bucket, limit = self._host(url)
+        kwargs.setdefault("timeout", self.timeout)
+        error = ""
+        for attempt in range(self.retries + 1):
+            bucket.acquire()
+            limit.acquire()
+            response = None
+            try:
+                response = self.session.get(url, **kwargs)  # type: ignore[arg-type]
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+            except BaseException:
+                limit.release()
+                raise
+            # Other errors, like 404, are for the caller to handle
+            if response is not None and response.status_code not in self.RETRY_STATUSES:
+                limit.succeeded()
+                # Hold the host's slot until the with block exits, so streamed
+                # bodies count against it
+                try:
+                    with response:
+                        yield response
+                finally:
+                    limit.release()
+                return
+            limit.release()
+
+            if response is not None:
+                error = f"{response.status_code} {response.reason}"
+                response.close()
+                if response.status_code in self.THROTTLE_STATUSES:
+                    limit.throttled()
+            if attempt == self.retries:
+                break
+            delay = self._delay(attempt, response)
+            if response is not None and response.status_code in self.THROTTLE_STATUSES:
+                # Back off the whole host, not just this request
+                bucket.pause(delay)
+            logger.warning("Retrying %s in %.1fs after %s", url, delay, error)
+            time.sleep(delay)
+        raise RequestError(
+            f"Error fetching {url} after {self.retries + 1} attempts: {error}"
+        )
@@ -0,0 +1,155 @@
+"""Read and write saved album protobufs, as formatted JSON or in a compact format
+
+The compact format is gzip-compressed JSON lines:
+
+    {"format": "photoalbum-protobuf", "version": 1, "arrays": {"1": 2, "4": 1}}
+    <the protobuf, with the arrays in "arrays" emptied>
+    <item 1 of array 1>
+    <item 2 of array 1>
+    <item 1 of array 4>
+
+"arrays" gives the number of items taken out of each array, in the order
+they follow, so they can be read one at a time without loading the rest.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+from pathlib import Path
+from typing import IO, Iterator
+
+from .atomic import atomic_path
+
+FORMAT = "photoalbum-protobuf"
+VERSION = 1
+GZIP_MAGIC = b"\x1f\x8b"
+# How a compact file starts, as written by json.dumps
+HEADER_PREFIX = '{"format"'
+
+
+def _open_text(path: Path) -> IO[str]:
+    """Open `path` for reading as text, decompressing it if it's gzipped"""
+    with path.open("rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed:
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8")
+    return path.open("r", encoding="utf-8")
+
+
+def _read_header(f: IO[str]) -> dict | None:
+    """The compact format's header, if `f` starts with one
+
+    Only reads the rest of the line if it looks like a header, as a
+    minified JSON file is all one line.
+    """
+    prefix = f.read(len(HEADER_PREFIX))
+    if prefix != HEADER_PREFIX:
+        return None
+    header: dict = json.loads(prefix + f.readline())
+    if header.get("format") != FORMAT:
+        return None
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported {FORMAT} version {header['version']}")
+    return header
+
+
+class CompactReader:
+    """Read a compact file an item at a time
+
+    with CompactReader(path) as reader:
+        name = reader.skeleton[3][1]
+        for array_index, item in reader.items():
+            ...
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = _open_text(path)
+        try:
+            header = _read_header(self._file)
+            if header is None:
+                raise ValueError(f"{path} isn't in the compact format")
+            self.counts = {int(index): n for index, n in header["arrays"].items()}
+            # The protobuf without the items
+            self.skeleton: list = json.loads(self._file.readline())
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __enter__(self) -> CompactReader:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def items(self) -> Iterator[tuple[int, list]]:
+        """Each item with the index of the array it's from, in file order"""
+        for index, count in self.counts.items():
+            for _ in range(count):
+                yield index, json.loads(self._file.readline())
+
+
+def is_compact(path: Path) -> bool:
+    """Whether `path` is in the compact format, rather than plain or gzipped JSON"""
+    with _open_text(path) as f:
+        return _read_header(f) is not None
+
+
+def read_protobuf(path: Path) -> list:
+    """The whole protobuf from `path`, in either format"""
+    if not is_compact(path):
+        with _open_text(path) as f:
+            protobuf: list = json.load(f)
+            return protobuf
+    with CompactReader(path) as reader:
+        protobuf = reader.skeleton
+        for index, item in reader.items():
+            protobuf[index].append(item)
+    return protobuf
+
+
+def write_protobuf(
+    protobuf: list, path: Path, compact: bool = False, arrays: tuple[int, ...] = ()
+) -> None:
+    """Write `protobuf` to `path`, as formatted JSON or compactly
+
+    In the compact format, each item of the arrays at the `arrays` indexes
+    goes on its own line, for CompactReader.
+    """
+    with atomic_path(path) as temp_path:
+        if not compact:
+            with temp_path.open("w") as f:
+                json.dump(protobuf, f, indent=4)
+        else:
+            _write_compact(protobuf, temp_path, arrays)
+
+
+def _write_compact(protobuf: list, path: Path, arrays: tuple[int, ...]) -> None:
+    streamed = [
+        index
+        for index in sorted(arrays)
+        if index < len(protobuf) and isinstance(protobuf[index], list)
+    ]
+    skeleton = list(protobuf)
+    for index in streamed:
+        skeleton[index] = []
+    header = {
+        "format": FORMAT,
+        "version": VERSION,
+        "arrays": {str(index): len(protobuf[index]) for index in streamed},
+    }
+
+    def line(value: object) -> bytes:
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+    with gzip.open(path, "wb", compresslevel=6) as f:
+        f.write(line(header) + b"\n")
+        f.write(line(skeleton) + b"\n")
+        for index in streamed:
+            for item in protobuf[index]:
+                f.write(line(item) + b"\n")
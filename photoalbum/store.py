@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+
+from .atomic import atomic_path, write_atomic
+from .manifest import Manifest
+
+logger = logging.getLogger(__name__)
+
+# ioctl to clone a file's extents on filesystems that support it (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def clone_file(source: Path, destination: Path) -> None:
+    """Hardlink `source` to `destination`, falling back to a reflink then a copy"""
+    try:
+        os.link(source, destination)
+        return
+    except OSError:
+        pass
+    if sys.platform == "linux":
+        import fcntl
+
+        try:
+            with source.open("rb") as src, destination.open("wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            destination.unlink(missing_ok=True)
+    shutil.copyfile(source, destination)
+
+
+class BlobStore:
+    """Content-addressed store of image files, shared between albums
+
+    Images are placed into album directories as hardlinks to the blobs, so an
+    image in several albums is downloaded and stored once.
+
+    <root>/
+        blobs/<first 2 of sha256>/<sha256><ext>
+        ids/<file_id>/<size parameter> # contains the blob name, "<sha256><ext>"
+        albums.json # album directories that have used the store, for gc
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.blob_directory = root / "blobs"
+        self.id_directory = root / "ids"
+        self.albums_path = root / "albums.json"
+        self._lock = threading.Lock()
+        self.blob_directory.mkdir(parents=True, exist_ok=True)
+        self.id_directory.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, blob_name: str) -> Path:
+        return self.blob_directory / blob_name[:2] / blob_name
+
+    def lookup(self, file_id: str | Path, size: str) -> Path | None:
+        """The blob for `file_id` at `size`, if the store has it"""
+        try:
+            blob_name = (self.id_directory / file_id / size).read_text().strip()
+        except FileNotFoundError:
+            return None
+        blob = self.blob_path(blob_name)
+        return blob if blob.exists() else None
+
+    def add(
+        self,
+        path: Path,
+        file_id: str | Path,
+        size: str,
+        sha256: str,
+        replace: bool = False,
+    ) -> Path:
+        """Add the downloaded file at `path` to the store
+
+        If the store already has a blob with the same content, `path` is
+        replaced by a link to it. With `replace`, the blob is replaced by
+        `path` instead, eg in case it's been corrupted.
+        """
+        blob = self.blob_path(f"{sha256}{path.suffix}")
+        blob.parent.mkdir(exist_ok=True)
+        if replace:
+            with atomic_path(blob) as temp:
+                clone_file(path, temp)
+        else:
+            try:
+                os.link(path, blob)
+            except FileExistsError:
+                self.place(blob, path)
+            except OSError:
+                # Different filesystem, or no hardlinks
+                with atomic_path(blob) as temp:
+                    clone_file(path, temp)
+
+        id_path = self.id_directory / file_id / size
+        id_path.parent.mkdir(exist_ok=True)
+        write_atomic(id_path, blob.name.encode())
+        return blob
+
+    def place(self, blob: Path, destination: Path) -> None:
+        """Put `blob` at `destination` as a hardlink, reflink or copy"""
+        with atomic_path(destination) as temp:
+            clone_file(blob, temp)
+
+    def _read_albums(self) -> list[str]:
+        try:
+            with self.albums_path.open("r") as f:
+                albums: list[str] = json.load(f)
+                return albums
+        except FileNotFoundError:
+            return []
+
+    def _write_albums(self, albums: list[str]) -> None:
+        write_atomic(self.albums_path, json.dumps(albums, indent=1).encode())
+
+    def register_album(self, directory: Path) -> None:
+        """Record that `directory` uses the store, so gc keeps its images"""
+        album = str(directory.resolve())
+        with self._lock:
+            albums = self._read_albums()
+            if album not in albums:
+                self._write_albums(albums + [album])
+
+    def gc(self) -> list[Path]:
+        """Delete blobs that no registered album references any more
+
+        References come from the manifests of the registered albums. Blobs still
+        hardlinked from somewhere are kept regardless. Albums that no longer
+        exist are dropped from the register.
+        """
+        referenced: set[str] = set()
+        with self._lock:
+            albums = [a for a in self._read_albums() if Path(a).is_dir()]
+            self._write_albums(albums)
+        for album in albums:
+            manifest = Manifest.load(Path(album) / Manifest.FILENAME)
+            referenced.update(entry["sha256"] for entry in manifest.entries.values())
+
+        removed = []
+        for blob in self.blob_directory.glob("*/*"):
+            if blob.name.startswith("."):
+                continue
+            sha256 = blob.name.partition(".")[0]
+            if sha256 in referenced or blob.stat().st_nlink > 1:
+                continue
+            logger.debug("Removing unreferenced blob %s", blob)
+            blob.unlink()
+            removed.append(blob)
+
+        # Drop file_id entries that point at removed blobs
+        for id_path in self.id_directory.glob("*/*"):
+            if id_path.name.startswith("."):
+                continue
+            if not self.blob_path(id_path.read_text().strip()).exists():
+                id_path.unlink()
+        logger.info("Removed %d blobs from %s", len(removed), self.root)
+        return removed
@@ -0,0 +1,85 @@
+// Maps are drawn from the views in <script id="map-data">, each only when it
+// scrolls into view. The tile URL is set per album, on <body data-tile-url="...">
+var mapboxAttribution = '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors';
+
+// Markers closer than this many pixels are grouped, on clustered maps
+const CLUSTER_PIXELS = 60;
+
+const mapbox = (map) => {
+    return L.tileLayer(document.body.dataset.tileUrl, {
+        attribution: mapboxAttribution,
+    }).addTo(map)
+};
+
+const clusterMarkers = (map, markers) => {
+    const layer = L.layerGroup().addTo(map);
+    const draw = () => {
+        layer.clearLayers();
+        const cells = {};
+        for (const marker of markers) {
+            const cell = map.project(marker).divideBy(CLUSTER_PIXELS).floor();
+            const key = cell.x + ',' + cell.y;
+            cells[key] = cells[key] || [];
+            cells[key].push(marker);
+        }
+        for (const cell of Object.values(cells)) {
+            if (cell.length === 1) {
+                L.marker(cell[0]).addTo(layer);
+                continue;
+            }
+            const bounds = L.latLngBounds(cell);
+            L.marker(bounds.getCenter(), {
+                icon: L.divIcon({ className: 'cluster', html: String(cell.length), iconSize: [32, 32] }),
+            }).on('click', () => map.fitBounds(bounds)).addTo(layer);
+        }
+    };
+    map.on('zoomend', draw);
+    draw();
+};
+
+const showMap = (element, view) => {
+    const map = L.map(element, {
+        zoomSnap: 0.5
+    });
+    mapbox(map);
+
+    if (view.zoom) {
+        map.setView(view.markers[0], view.zoom);
+    } else {
+        map.fitBounds(L.latLngBounds(view.markers));
+    }
+    for (const line of view.lines || []) {
+        L.polyline(line, { color: 'red' }).addTo(map);
+    }
+    if (view.cluster) {
+        clusterMarkers(map, view.markers);
+    } else {
+        for (const marker of view.markers) {
+            L.marker(marker).addTo(map);
+        }
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => {
+    const data = document.getElementById('map-data');
+    if (!data) {
+        return;
+    }
+    const views = JSON.parse(data.textContent);
+    const elements = [...document.querySelectorAll('.map[data-map]')].filter((element) => views[element.dataset.map]);
+    const show = (element) => showMap(element, views[element.dataset.map]);
+
+    if (!('IntersectionObserver' in window)) {
+        elements.forEach(show);
+        return;
+    }
+    const observer = new IntersectionObserver((entries) => {
+        for (const entry of entries) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                show(entry.target);
+            }
+        }
+    }, { rootMargin: '200px' });
+    elements.forEach((element) => observer.observe(element));
+});
@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .atomic import write_atomic
+from .cache import entries_to_evict, mark_used
+from .enrichments import Enrichments, Location, Map
+from .store import clone_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TILE_URL = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+TILE_SIZE = 256
+MAX_ZOOM = 18
+# Zoom a Location's map is shown at
+LOCATION_ZOOM = 14
+# Range of sizes in pixels of a .map box in album.css. The width is 50% of
+# the page, so the tiles needed depend on the viewer's screen.
+MAP_MIN_WIDTH = 320
+MAP_MAX_WIDTH = 1024
+MAP_HEIGHT = 300
+
+Tile = tuple[int, int, int]  # z, x, y
+# A cached tile's path under the cache directory, as written by TileCache
+TILE_PATH = re.compile(r"[0-9a-f]{12}/\d+/\d+/\d+\.png")
+
+
+def tile_coordinates(lat: float, lon: float, zoom: int) -> tuple[float, float]:
+    """Web Mercator position of `lat`, `lon` in tiles at `zoom`"""
+    n = 2**zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = (lon + 180) / 360 * n
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return x, y
+
+
+def tiles_for_view(
+    lat: float,
+    lon: float,
+    zoom: int,
+    width: int = MAP_MAX_WIDTH,
+    height: int = MAP_HEIGHT,
+) -> set[Tile]:
+    """Tiles visible in a `width` by `height` pixel map centred on `lat`, `lon`"""
+    x, y = tile_coordinates(lat, lon, zoom)
+    half_width = width / TILE_SIZE / 2
+    half_height = height / TILE_SIZE / 2
+    n = 2**zoom
+    return {
+        (zoom, tile_x % n, tile_y)
+        for tile_x in range(math.floor(x - half_width), math.floor(x + half_width) + 1)
+        for tile_y in range(
+            math.floor(y - half_height), math.floor(y + half_height) + 1
+        )
+        if 0 <= tile_y < n
+    }
+
+
+def fit_zoom(
+    source: tuple[float, float],
+    destination: tuple[float, float],
+    width: int,
+    height: int = MAP_HEIGHT,
+) -> int:
+    """Highest zoom showing both points in a `width` by `height` map, like Leaflet's fitBounds"""
+    for zoom in range(MAX_ZOOM, 0, -1):
+        x1, y1 = tile_coordinates(*source, zoom)
+        x2, y2 = tile_coordinates(*destination, zoom)
+        if abs(x1 - x2) * TILE_SIZE <= width and abs(y1 - y2) * TILE_SIZE <= height:
+            return zoom
+    return 0
+
+
+def tiles_for_enrichment(enrichment: Enrichments) -> set[Tile]:
+    """Tiles the map for a Location or Map shows when the page loads"""
+    if isinstance(enrichment, Location):
+        if enrichment.lat is None or enrichment.lon is None:
+            return set()
+        return tiles_for_view(enrichment.lat, enrichment.lon, LOCATION_ZOOM)
+
+    if isinstance(enrichment, Map):
+        source = enrichment.source_location
+        destination = enrichment.destination_location
+        if not source or not destination:
+            return set()
+        if (
+            source.lat is None
+            or source.lon is None
+            or destination.lat is None
+            or destination.lon is None
+        ):
+            return set()
+        return tiles_for_fit(
+            [(source.lat, source.lon), (destination.lat, destination.lon)]
+        )
+
+    return set()
+
+
+def tiles_for_fit(points: list[tuple[float, float]]) -> set[Tile]:
+    """Tiles a map fitted to show all of `points` shows when the page loads"""
+    south_west = (min(lat for lat, _ in points), min(lon for _, lon in points))
+    north_east = (max(lat for lat, _ in points), max(lon for _, lon in points))
+    center = (
+        (south_west[0] + north_east[0]) / 2,
+        (south_west[1] + north_east[1]) / 2,
+    )
+    # album.js snaps to half zooms, which Leaflet shows with tiles from the next zoom up
+    lowest = fit_zoom(south_west, north_east, MAP_MIN_WIDTH)
+    highest = min(fit_zoom(south_west, north_east, MAP_MAX_WIDTH) + 1, MAX_ZOOM)
+    tiles = set()
+    for zoom in range(lowest, highest + 1):
+        tiles |= tiles_for_view(*center, zoom)
+    return tiles
+
+
+class TileCache:
+    """Disk cache of map tiles, shared between albums
+
+    Tiles are kept per tile server, as <directory>/<server hash>/<z>/<x>/<y>.png.
+    Once the cache is larger than `max_bytes`, the least recently used tiles
+    are evicted.
+    """
+
+    USER_AGENT = "photos-album-scraper tile prefetch"
+
+    def __init__(
+        self,
+        directory: Path,
+        tile_url: str = DEFAULT_TILE_URL,
+        max_bytes: int = 500 * 1024 * 1024,
+        jobs: int = 4,
+    ) -> None:
+        self.tile_url = tile_url
+        server = hashlib.sha1(tile_url.encode()).hexdigest()[:12]
+        self.directory = directory / server
+        self.max_bytes = max_bytes
+        self.jobs = jobs
+        self._local = threading.local()
+
+    def tile_path(self, tile: Tile) -> Path:
+        z, x, y = tile
+        return Path(str(z)) / str(x) / f"{y}.png"
+
+    def fetch(self, tiles: set[Tile]) -> dict[Tile, Path]:
+        """Make sure `tiles` are cached, returning where each one is
+
+        Tiles that can't be fetched are left out.
+        """
+        cached: dict[Tile, Path] = {}
+
+        def fetch_tile(tile: Tile) -> None:
+            path = self.directory / self.tile_path(tile)
+            if path.exists():
+                mark_used(path)
+            else:
+                try:
+                    self._download(tile, path)
+                except Exception as e:
+                    logger.warning("Error fetching tile %s: %s", tile, e)
+                    return
+            cached[tile] = path
+
+        with ThreadPoolExecutor(
+            max_workers=self.jobs, thread_name_prefix="tile"
+        ) as executor:
+            list(executor.map(fetch_tile, sorted(tiles)))
+        return cached
+
+    def _download(self, tile: Tile, path: Path) -> None:
+        import requests
+
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers["User-Agent"] = self.USER_AGENT
+        z, x, y = tile
+        url = self.tile_url.format(z=z, x=x, y=y)
+        response = self._local.session.get(url, timeout=30)
+        if response.status_code != 200:
+            raise RuntimeError(f"Error fetching {url}: {response.status_code}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, response.content)
+
+    def evict(self) -> list[Path]:
+        """Delete the least recently used tiles until the cache fits in `max_bytes`
+
+        Tiles from every server count towards the limit. Only files laid out
+        like tiles are looked at, so anything else in the directory is left
+        alone.
+        """
+        tiles = []
+        for root, _, files in os.walk(self.directory.parent):
+            for name in files:
+                path = Path(root) / name
+                relative = path.relative_to(self.directory.parent).as_posix()
+                if not TILE_PATH.fullmatch(relative):
+                    continue
+                stat = path.stat()
+                tiles.append((False, stat.st_mtime, stat.st_size, path))
+
+        evicted = entries_to_evict(tiles, self.max_bytes)
+        for path in evicted:
+            path.unlink()
+        if evicted:
+            logger.info("Evicted %d tiles from %s", len(evicted), self.directory.parent)
+        return evicted
+
+    def copy_to(self, tiles: dict[Tile, Path], directory: Path) -> None:
+        """Put cached `tiles` in `directory`, laid out like the tile server"""
+        for tile, path in tiles.items():
+            destination = directory / self.tile_path(tile)
+            if destination.exists():
+                continue
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            clone_file(path, destination)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .image import Image
+
+if TYPE_CHECKING:
+    import requests
+
+    from .directory_index import DirectoryIndex
+    from .scheduler import RequestScheduler
+
+
+class Video(Image):
+    """A video in an album
+
+    Listed with the images, with the same layout, plus video details under
+    VIDEO_KEY in the dict at the end:
+
+        {
+            "76647426": [...], # duration, status, etc.
+            "101428965": [...]
+        }
+
+    base_url gives a still frame. Adding =dv gives the video itself, which
+    can't be resized.
+    """
+
+    VIDEO_KEY = "76647426"
+
+    render_template = "video.html.j2"
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        return f"Video: {self.file_id} {self.base_url} {self.width}x{self.height} path: {self.relative_path}"
+
+    @classmethod
+    def is_video(cls, protobuf: list) -> bool:
+        try:
+            return cls.VIDEO_KEY in protobuf[cls.ORDERING_DICT_IDX]
+        except (IndexError, TypeError):
+            return False
+
+    def size_param(
+        self, max_width: int | None = None, max_height: int | None = None
+    ) -> str:
+        """The base_url parameter for the original video. It can't be resized"""
+        return "dv"
+
+    def download_variant(
+        self,
+        directory: Path,
+        width: int,
+        redownload: bool = False,
+        session: requests.Session | RequestScheduler | None = None,
+        index: DirectoryIndex | None = None,
+    ) -> Path | None:
+        """Videos don't have smaller copies, so there's nothing to download"""
+        return None
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable
+
+from .album import Album
+from .enrichments import Enrichments
+from .image import Image
+
+if TYPE_CHECKING:
+    from .page_cache import PageCache
+    from .scheduler import RequestScheduler
+
+logger = logging.getLogger(__name__)
+
+
+def item_key(item: Enrichments | Image) -> tuple:
+    """What an item shows, for spotting changes between fetches
+
+    Images are identified by file_id rather than base_url, which isn't stable.
+    """
+    if isinstance(item, Image):
+        return (item.ordering_str, item.file_id, item.width, item.height)
+    return (item.ordering_str, str(item))
+
+
+def item_keys(album: Album) -> list[tuple]:
+    """Keys of all the album's items, in display order"""
+    return [item_key(item) for item in album.ordered_items()]
+
+
+class AlbumChanges:
+    """Differences between two fetches of an album"""
+
+    def __init__(self, previous: Album | None, current: Album) -> None:
+        previous_ids = (
+            {image.file_id for image in previous.images or []} if previous else set()
+        )
+        current_ids = {image.file_id for image in current.images or []}
+        self.added = [
+            image for image in current.images or [] if image.file_id not in previous_ids
+        ]
+        self.removed = previous_ids - current_ids
+        self.items_changed = previous is None
+        if previous is not None:
+            self.items_changed = item_keys(previous) != item_keys(current)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} images added, {len(self.removed)} removed"
+
+
+class AlbumWatcher:
+    """Keep the local copy of an album in step with the album online
+
+    Each `poll` fetches the album conditionally. If it changed, only new
+    images (and ones that failed before) are downloaded, images no longer in
+    the album are deleted, and the HTML is rendered again only if the items
+    it shows changed.
+
+    `configure` sets the output options on each newly fetched Album.
+    `download` is called with the album and the images to download, and
+    `render` with the album, if given. With a `cache`, the first poll can
+    use the album cached by an earlier run, if it hasn't changed.
+    """
+
+    def __init__(
+        self,
+        album_url: str,
+        configure: Callable[[Album], object] | None = None,
+        download: Callable[[Album, list[Image]], object] | None = None,
+        render: Callable[[Album], object] | None = None,
+        cache: PageCache | None = None,
+    ) -> None:
+        self.album_url = album_url
+        self.cache = cache
+        self.configure = configure
+        self.download = download
+        self.render = render
+        self.album: Album | None = None
+
+    def poll(self, session: RequestScheduler | None = None) -> AlbumChanges | None:
+        """Fetch the album and apply any changes, returning them
+
+        Returns None if the album page hasn't changed at all.
+        """
+        previous = self.album
+        album = Album()
+        if previous is not None:
+            album.validators = previous.validators
+        if not album.get_album(self.album_url, session=session, cache=self.cache):
+            if previous is not None:
+                previous.validators = album.validators
+            return None
+        album.parse_protobuf()
+        if self.configure:
+            self.configure(album)
+        if previous is not None:
+            # Keep the directory even if the album is renamed
+            album.album_directory = previous.album_directory
+            self._carry_over_files(previous, album)
+
+        changes = AlbumChanges(previous, album)
+        missing = [image for image in album.images or [] if image.src is None]
+        if previous is not None and not changes.items_changed and not missing:
+            logger.debug("%s: no changes", self.album_url)
+            self.album = album
+            return changes
+        logger.info("%s: %s", self.album_url, changes)
+
+        render = changes.items_changed
+        if self.download:
+            if missing:
+                self.download(album, missing)
+                # Images that failed last time change the HTML if they've arrived now
+                render = render or any(image.src for image in missing)
+            if changes.removed:
+                album.prune_images()
+        elif changes.items_changed:
+            album.find_local_images()
+        if self.render and render:
+            self.render(album)
+        self.album = album
+        return changes
+
+    @staticmethod
+    def _carry_over_files(previous: Album, album: Album) -> None:
+        """Reuse what's known about images already downloaded, instead of checking the disk again"""
+        downloaded = {image.file_id: image for image in previous.images or []}
+        for image in album.images or []:
+            old = downloaded.get(image.file_id)
+            if old is None or (old.width, old.height) != (image.width, image.height):
+                continue
+            image.relative_path = old.relative_path
+            image.size_bytes = old.size_bytes
+            image.sha256 = old.sha256
+            image.variants = old.variants
+            image.optimized_path = old.optimized_path
+
+
+def watch_albums(
+    watchers: list[AlbumWatcher],
+    interval: float,
+    session: RequestScheduler | None = None,
+    album_jobs: int = 1,
+    stop: threading.Event | None = None,
+) -> None:
+    """Poll every watcher each `interval` seconds, until `stop` is set
+
+    Up to `album_jobs` albums are polled at once. An album that fails to
+    update is logged and tried again next time.
+    """
+    stop = stop or threading.Event()
+
+    def poll(watcher: AlbumWatcher) -> None:
+        try:
+            watcher.poll(session)
+        except Exception:
+            logger.exception("Error updating %s", watcher.album_url)
+
+    with ThreadPoolExecutor(
+        max_workers=album_jobs, thread_name_prefix="watch"
+    ) as executor:
+        while not stop.is_set():
+            start = time.monotonic()
+            list(executor.map(poll, watchers))
+            stop.wait(max(0.0, interval - (time.monotonic() - start)))
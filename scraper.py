@@ -1,19 +1,218 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
 import argparse
+import logging
+import sys
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from photoalbum.album import Album
+from photoalbum.batch import BatchReport, is_url, read_sources, run_batch
+from photoalbum.store import BlobStore
+from photoalbum.tiles import DEFAULT_TILE_URL, TileCache
+
+if TYPE_CHECKING:
+    from photoalbum.downloader import Downloader, DownloadSummary
+    from photoalbum.image import Image
+    from photoalbum.metrics import Metrics
+    from photoalbum.page_cache import PageCache
+
+
+def make_downloader(args: argparse.Namespace) -> Downloader:
+    """Downloader shared by all requests, configured from `args`"""
+    from photoalbum.downloader import Downloader
+
+    return Downloader(
+        jobs=args.jobs,
+        rate=args.rate_limit,
+        retries=args.retries,
+        segments=args.segments,
+    )
+
+
+def scrape(
+    args: argparse.Namespace,
+    fetch: str | None = None,
+    load: Path | None = None,
+    downloader: Downloader | None = None,
+    store: BlobStore | None = None,
+    metrics: Metrics | None = None,
+    page_cache: PageCache | None = None,
+) -> DownloadSummary | None:
+    """Fetch or load one album, then do whatever `args` asks for with it"""
+    album = Album()
+    if metrics is not None:
+        album.hooks.append(metrics)
+    if fetch:
+        album.get_album(
+            fetch,
+            session=downloader.scheduler if downloader else None,
+            cache=page_cache,
+        )
+    elif load and not args.save_protobuf:
+        # Nothing needs the whole protobuf, so parse it as it's read
+        album.load_parsed(load)
+    elif load:
+        album.load_protobuf(load)
+
+    if args.save_protobuf:
+        album.write_protobuf(args.save_protobuf, compact=args.compact_protobuf)
+
+    if album.protobuf is not None:
+        album.parse_protobuf()
+    configure(args, album)
+
+    if args.print_ordering:
+        album.print_ordering()
+
+    summary = None
+    if args.download:
+        summary = download(args, album, downloader, store)
+        if args.prune:
+            album.prune_images()
+    elif args.render or args.optimize:
+        album.find_local_images()
+        if args.optimize:
+            optimize(args, album)
+
+    if args.render:
+        render(args, album)
+
+    return summary
+
+
+def configure(args: argparse.Namespace, album: Album) -> None:
+    """Set the output options from `args` on a parsed album"""
+    if args.output_directory:
+        album.output_directory = args.output_directory
+    if args.album_directory_name:
+        album.album_directory = args.album_directory_name
+    if args.html_filename:
+        album.html_filename = args.html_filename
+    album.tile_url = args.tile_server
+
+
+def download(
+    args: argparse.Namespace,
+    album: Album,
+    downloader: Downloader | None = None,
+    store: BlobStore | None = None,
+    images: list[Image] | None = None,
+) -> DownloadSummary:
+    """Download the album's images, or just `images`, then optimize them if asked"""
+    summary = album.download_images(
+        max_width=args.max_width,
+        max_height=args.max_height,
+        redownload=args.redownload,
+        jobs=args.jobs,
+        downloader=downloader,
+        store=store,
+        variant_widths=args.variant_widths,
+        images=images,
+    )
+    if args.optimize:
+        optimize(args, album)
+    return summary
+
+
+def optimize(args: argparse.Namespace, album: Album) -> None:
+    from photoalbum.optimize import Optimizer
+
+    album.optimize_images(
+        Optimizer(
+            format=args.optimize,
+            quality=args.quality,
+            strip_metadata=args.strip_metadata,
+            keep_originals=not args.drop_originals,
+            jobs=args.optimize_jobs,
+        )
+    )
+
+
+def render(args: argparse.Namespace, album: Album) -> None:
+    if args.cache_tiles:
+        album.prefetch_tiles(
+            TileCache(
+                args.cache_tiles,
+                tile_url=args.tile_server,
+                max_bytes=args.tile_cache_size * 1024 * 1024,
+                jobs=args.jobs,
+            ),
+            overview=args.overview_map,
+        )
+    album.render_html(
+        page_size=args.page_size,
+        static_assets=args.static_assets,
+        overview=args.overview_map,
+    )
+
+
+def watch(
+    args: argparse.Namespace,
+    album_urls: list[str],
+    downloader: Downloader,
+    store: BlobStore | None = None,
+    page_cache: PageCache | None = None,
+) -> None:
+    """Keep the albums at `album_urls` mirrored until interrupted"""
+    from photoalbum.watch import AlbumWatcher, watch_albums
+
+    watchers = [
+        AlbumWatcher(
+            album_url,
+            configure=lambda album: configure(args, album),
+            download=(
+                (lambda album, images: download(args, album, downloader, store, images))
+                if args.download
+                else None
+            ),
+            render=(lambda album: render(args, album)) if args.render else None,
+            cache=page_cache,
+        )
+        for album_url in album_urls
+    ]
+    try:
+        watch_albums(
+            watchers,
+            args.watch,
+            session=downloader.scheduler,
+            album_jobs=args.album_jobs,
+        )
+    except KeyboardInterrupt:
+        pass
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Scrapes a Google Photos album into a static HTML page with locally saved images, including text and maps."
     )
+    verbosity_group = parser.add_mutually_exclusive_group()
+    verbosity_group.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Also log each file checked and downloaded, and how long each phase took",
+    )
+    verbosity_group.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="Only log warnings and errors",
+    )
 
     # Where to get data - 1 required
     source_group = parser.add_argument_group(
         "Album Source",
         "Where to fetch the album from. Exactly one of these is required.",
     )
+    source_group.add_argument(
+        "--batch",
+        metavar="FILENAME",
+        type=Path,
+        help="Process many albums at once. FILENAME lists album URLs or saved protobuf files, one per line. See also --album-jobs",
+    )
     source_group.add_argument(
         "--fetch",
         metavar="URL",
@@ -46,11 +245,22 @@ if __name__ == "__main__":
         type=Path,
         help="Write the album's protobuf output to this file. Useful for debugging, or saving the album info so the HTML can be changed and re-rendered. See also --load",
     )
+    behaviour_group.add_argument(
+        "--compact-protobuf",
+        action="store_true",
+        help="Write --save-protobuf as gzipped JSON with one item per line, which is much smaller and quicker to load. --load reads either",
+    )
     behaviour_group.add_argument(
         "--print-ordering",
         action="store_true",
         help="Print each item in sorted order. Mostly for debugging.",
     )
+    behaviour_group.add_argument(
+        "--watch",
+        metavar="SECONDS",
+        type=float,
+        help="Keep running, checking the album for changes every SECONDS. Only new images are downloaded, removed ones are deleted, and the HTML is rewritten only if the album's items changed. Needs --fetch, or a --batch of URLs",
+    )
 
     # Image download options
     image_group = parser.add_argument_group(
@@ -72,7 +282,101 @@ if __name__ == "__main__":
     image_group.add_argument(
         "--redownload",
         action="store_true",
-        help="Force all images to be downloaded, even if they already exist. Useful if --max-width or --max-height changed.",
+        help="Force all images to be downloaded, even if they already exist. Images downloaded at a different --max-width or --max-height are fetched again without this.",
+    )
+    image_group.add_argument(
+        "--variant-widths",
+        metavar="W,W,...",
+        type=lambda value: sorted({int(width) for width in value.split(",")}),
+        default=None,
+        help="Also download smaller copies of each image at these widths, eg 480,960,1920, so the HTML can offer them with srcset. Stored in a w<width> directory per width.",
+    )
+    image_group.add_argument(
+        "--prune",
+        action="store_true",
+        help="Delete previously downloaded images that have been removed from the album",
+    )
+    image_group.add_argument(
+        "--store",
+        metavar="PATH",
+        type=Path,
+        help="Shared image store. Images already in it are hardlinked into the album instead of downloaded, and new downloads are added to it. Useful when albums share photos.",
+    )
+    image_group.add_argument(
+        "--gc-store",
+        action="store_true",
+        help="Delete images from --store that no album uses any more. Can be given without an album source.",
+    )
+    image_group.add_argument(
+        "--jobs",
+        metavar="N",
+        type=int,
+        default=4,
+        help="Number of images to download at once. With --batch, this is shared by all albums. Default: 4",
+    )
+    image_group.add_argument(
+        "--rate-limit",
+        metavar="N",
+        type=float,
+        default=None,
+        help="Maximum requests per second to each host. Default: no limit, but back off when the host throttles",
+    )
+    image_group.add_argument(
+        "--retries",
+        metavar="N",
+        type=int,
+        default=5,
+        help="Times to retry a request that fails with a connection error, timeout, 429 or 5xx. Default: 5",
+    )
+    image_group.add_argument(
+        "--segments",
+        metavar="N",
+        type=int,
+        default=1,
+        help="Download files over 8 MB, like videos, in N parts at once. Each part counts towards --jobs. Default: 1",
+    )
+    image_group.add_argument(
+        "--album-jobs",
+        metavar="N",
+        type=int,
+        default=4,
+        help="Number of albums to fetch and process at once with --batch. Default: 4",
+    )
+
+    # Optimization options
+    optimize_group = parser.add_argument_group(
+        "Optimization",
+        "Make smaller copies of the downloaded images for the HTML to use. Needs Pillow, and pillow-heif for HEIC images.",
+    )
+    optimize_group.add_argument(
+        "--optimize",
+        metavar="FORMAT",
+        choices=["webp", "avif", "jpeg"],
+        help="Re-encode images as webp, avif or jpeg, into an `optimized` directory. Images already done with the same settings are skipped",
+    )
+    optimize_group.add_argument(
+        "--quality",
+        metavar="N",
+        type=int,
+        default=80,
+        help="Quality for --optimize, from 1 to 100. Default: 80",
+    )
+    optimize_group.add_argument(
+        "--strip-metadata",
+        action="store_true",
+        help="Leave EXIF metadata, like location and camera details, out of the optimized images",
+    )
+    optimize_group.add_argument(
+        "--drop-originals",
+        action="store_true",
+        help="Delete the original images once they're optimized. They aren't downloaded again while the optimized copies are there",
+    )
+    optimize_group.add_argument(
+        "--optimize-jobs",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Number of images to optimize at once. Default: number of CPUs",
     )
 
     # Output options
@@ -97,42 +401,207 @@ if __name__ == "__main__":
         type=Path,
         help="HTML output file name. Default: index.html",
     )
+    config_group.add_argument(
+        "--page-size",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Split the HTML into pages of N items: the first in --html-filename, then page-2.html, page-3.html, etc. Default: one page",
+    )
+    config_group.add_argument(
+        "--static-assets",
+        action="store_true",
+        help="Link the CSS and JavaScript from content-hashed files in OUTPUT-DIRECTORY/static, shared by all albums, rather than putting them in each page. Also writes .gz and .br copies of the pages and those files (.br needs brotli installed), and an assets.json listing which files never change, for serving them with far-future cache headers",
+    )
+    config_group.add_argument(
+        "--report",
+        metavar="FILENAME",
+        type=Path,
+        help="Write a JSON report of the run: how long each phase took, download counts, bytes, throughput and latency percentiles, and errors, per album",
+    )
+
+    # Page cache options
+    page_cache_group = parser.add_argument_group(
+        "Page cache",
+        "Keep what was extracted from album pages, so unchanged albums aren't downloaded and extracted again",
+    )
+    page_cache_group.add_argument(
+        "--cache-pages",
+        metavar="PATH",
+        type=Path,
+        help="Cache album pages in this directory, which can be shared between albums and runs. Each fetch asks the server whether the page has changed since it was cached, and uses the cached album if not",
+    )
+    page_cache_group.add_argument(
+        "--page-cache-size",
+        metavar="MB",
+        type=int,
+        default=100,
+        help="Size limit for --cache-pages. The least recently used pages are removed past this. Default: 100",
+    )
+    page_cache_group.add_argument(
+        "--page-cache-age",
+        metavar="HOURS",
+        type=float,
+        default=168,
+        help="Don't use cached pages that haven't been checked with the server for this long. Default: 168 (a week)",
+    )
+
+    # Map options
+    map_group = parser.add_argument_group(
+        "Maps", "Configure the map tiles used for locations and maps in the HTML"
+    )
+    map_group.add_argument(
+        "--tile-server",
+        metavar="URL",
+        default=DEFAULT_TILE_URL,
+        help=f"Tile URL template, with {{z}}, {{x}} and {{y}} placeholders. Default: {DEFAULT_TILE_URL}",
+    )
+    map_group.add_argument(
+        "--overview-map",
+        action="store_true",
+        help="Start each page with one map of all the album's locations and maps, with nearby places grouped",
+    )
+    map_group.add_argument(
+        "--cache-tiles",
+        metavar="PATH",
+        type=Path,
+        help="When rendering, fetch the tiles each map shows into this cache directory, which can be shared between albums, and copy them into the album so the maps work offline",
+    )
+    map_group.add_argument(
+        "--tile-cache-size",
+        metavar="MB",
+        type=int,
+        default=500,
+        help="Size limit for --cache-tiles. The least recently used tiles are removed past this. Default: 500",
+    )
 
     args = parser.parse_args()
-    if not (args.fetch or args.load):
-        parser.error("Must specify one of --fetch or --load")
-    if args.fetch and args.load:
-        parser.error("Only one of --fetch and --load may be specified")
+    sources = [x for x in (args.fetch, args.load, args.batch) if x]
+    if args.gc_store and not args.store:
+        parser.error("--gc-store requires --store")
+    if not sources and not args.gc_store:
+        parser.error("Must specify one of --fetch, --load or --batch")
+    if len(sources) > 1:
+        parser.error("Only one of --fetch, --load and --batch may be specified")
+    if args.batch and (args.save_protobuf or args.album_directory_name):
+        parser.error(
+            "--save-protobuf and --album-directory-name only apply to a single album"
+        )
+    if args.jobs < 1 or args.album_jobs < 1 or args.segments < 1:
+        parser.error("--jobs, --album-jobs and --segments must be at least 1")
+    if args.page_size is not None and args.page_size < 1:
+        parser.error("--page-size must be at least 1")
+    if args.compact_protobuf and not args.save_protobuf:
+        parser.error("--compact-protobuf needs --save-protobuf")
+    if (args.drop_originals or args.strip_metadata) and not args.optimize:
+        parser.error("--drop-originals and --strip-metadata need --optimize")
+    if not 1 <= args.quality <= 100:
+        parser.error("--quality must be from 1 to 100")
+    if args.watch is not None:
+        if args.load or args.save_protobuf or args.report:
+            parser.error(
+                "--watch can't be used with --load, --save-protobuf or --report"
+            )
+        if args.watch <= 0:
+            parser.error("--watch must be more than 0 seconds")
 
-    album = Album()
-    if args.fetch:
-        album.get_album(args.fetch)
-    elif args.load:
-        album.load_protobuf(args.load)
+    if args.verbose:
+        level = logging.DEBUG
+    elif args.quiet:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    logging.basicConfig(level=level, format="%(message)s")
+    # Pillow's debug logging lists every plugin it loads
+    logging.getLogger("PIL").setLevel(max(level, logging.INFO))
 
-    if args.save_protobuf:
-        album.write_protobuf(args.save_protobuf)
+    store = BlobStore(args.store) if args.store else None
+    page_cache = None
+    if args.cache_pages:
+        from photoalbum.page_cache import PageCache
 
-    album.parse_protobuf()
+        page_cache = PageCache(
+            args.cache_pages,
+            max_bytes=args.page_cache_size * 1024 * 1024,
+            max_age=args.page_cache_age * 60 * 60,
+        )
 
-    if args.output_directory:
-        album.output_directory = args.output_directory
-    if args.album_directory_name:
-        album.album_directory = args.album_directory_name
-    if args.html_filename:
-        album.html_filename = args.html_filename
+    start = time.perf_counter()
+    album_metrics: dict[str, Metrics] = {}
+    errors: dict[str, str | None] = {}
+    # Only set by --batch without --watch
+    report: BatchReport | None = None
 
-    if args.print_ordering:
-        album.print_ordering()
+    def new_metrics(source: str) -> Metrics | None:
+        """Metrics for the album from `source`, if there's a --report"""
+        if not args.report:
+            return None
+        from photoalbum.metrics import Metrics
 
-    if args.download:
-        album.download_images(
-            max_width=args.max_width,
-            max_height=args.max_height,
-            redownload=args.redownload,
-        )
+        album_metrics[source] = Metrics()
+        return album_metrics[source]
 
-    if args.render:
-        if not args.download:
-            album.find_local_images()
-        album.render_html()
+    try:
+        if args.watch is not None and sources:
+            album_urls = read_sources(args.batch) if args.batch else [args.fetch]
+            if not all(is_url(source) for source in album_urls):
+                parser.error("--watch only works with album URLs")
+            with make_downloader(args) as downloader:
+                watch(args, album_urls, downloader, store, page_cache)
+        elif args.batch:
+            with make_downloader(args) as downloader:
+                report = run_batch(
+                    read_sources(args.batch),
+                    lambda source: scrape(
+                        args,
+                        fetch=source if is_url(source) else None,
+                        load=None if is_url(source) else Path(source),
+                        downloader=downloader,
+                        store=store,
+                        metrics=new_metrics(source),
+                        page_cache=page_cache,
+                    ),
+                    album_jobs=args.album_jobs,
+                )
+            errors = report.errors
+            report.print_report()
+        elif sources:
+            source = str(args.fetch or args.load)
+            try:
+                if args.fetch or args.download:
+                    with make_downloader(args) as downloader:
+                        scrape(
+                            args,
+                            fetch=args.fetch,
+                            load=args.load,
+                            downloader=downloader,
+                            store=store,
+                            metrics=new_metrics(source),
+                            page_cache=page_cache,
+                        )
+                else:
+                    # Offline, so don't import anything network related
+                    scrape(
+                        args, load=args.load, store=store, metrics=new_metrics(source)
+                    )
+            except Exception as e:
+                errors[source] = f"{type(e).__name__}: {e}"
+                raise
+    finally:
+        if args.report:
+            from photoalbum.metrics import write_report
+
+            write_report(
+                args.report,
+                [
+                    {"source": source, "error": errors.get(source), **metrics.report()}
+                    for source, metrics in album_metrics.items()
+                ],
+                time.perf_counter() - start,
+            )
+
+    if store and args.gc_store:
+        store.gc()
+
+    if report is not None and report.failed:
+        sys.exit(1)
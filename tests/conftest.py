@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pytest
+
+from photoalbum.album import Album
+from photoalbum.image import Image
+from photoalbum.video import Video
+
+from .server import JPEG_HEADER, FileServer
+
+
+@pytest.fixture
+def file_server() -> Iterator[FileServer]:
+    server = FileServer()
+    thread = threading.Thread(target=server.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+
+
+@pytest.fixture
+def jpeg() -> Callable[[int], bytes]:
+    """Make a JPEG header padded with varying bytes to a size"""
+
+    def jpeg(size: int) -> bytes:
+        return JPEG_HEADER + bytes(i % 251 for i in range(size - len(JPEG_HEADER)))
+
+    return jpeg
+
+
+@pytest.fixture
+def make_image() -> Callable[..., Image]:
+    """Make a parsed Image, or Video, laid out as in an album's protobuf"""
+
+    def make_image(
+        base_url: str, file_id: str, width: int = 4000, video: bool = False
+    ) -> Image:
+        ordering = {Image.ORDERING_KEY: [0, f"{file_id}-order"]}
+        if video:
+            ordering[Video.VIDEO_KEY] = [1000]
+        protobuf = [
+            f"{file_id}-key",
+            [base_url, width, 3000],
+            0,
+            file_id,
+            0,
+            0,
+            [],
+            [],
+            2,
+            None,
+            None,
+            None,
+            [],
+            None,
+            0,
+            [],
+            ordering,
+        ]
+        image = Video(protobuf) if Video.is_video(protobuf) else Image(protobuf)
+        image.parse_protobuf()
+        return image
+
+    return make_image
+
+
+@pytest.fixture
+def album_directory(tmp_path: Path) -> Path:
+    directory = tmp_path / "album"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def album(tmp_path: Path) -> Album:
+    """An empty album, output to `tmp_path`. Set its images to use it"""
+    album = Album()
+    album.name = "Test album"
+    album.output_directory = tmp_path
+    album.images = []
+    album.enrichments = []
+    return album
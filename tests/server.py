@@ -0,0 +1,96 @@
+"""Local HTTP stand-in for the servers images are downloaded from, for tests"""
+
+import http.server
+import re
+import threading
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01"
+
+
+class FileServer:
+    """Local HTTP server for downloads, which supports Range and If-Range
+
+    Files are served at /<name>, ignoring any =<size> suffix, with a strong
+    ETag. Set `ignore_ranges` to answer every request with the whole file,
+    or queue error responses for a file with `fail`. Each request's path and
+    headers are kept in `requests`.
+    """
+
+    def __init__(self) -> None:
+        self.files: dict[str, tuple[bytes, str]] = {}
+        self.etags: dict[str, str] = {}
+        self.ignore_ranges = False
+        self.failures: dict[str, list[tuple[int, dict[str, str]]]] = {}
+        self.requests: list[tuple[str, dict[str, str]]] = []
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                with server._lock:
+                    server.requests.append((self.path, dict(self.headers)))
+                name = self.path.lstrip("/").partition("=")[0]
+                if name not in server.files:
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    failures = server.failures.get(name)
+                    failure = failures.pop(0) if failures else None
+                if failure:
+                    status, headers = failure
+                    self.respond(status, b"", headers)
+                    return
+                body, content_type = server.files[name]
+                etag = server.etags[name]
+                headers = {"Content-Type": content_type, "ETag": etag}
+
+                match = re.fullmatch(
+                    r"bytes=(\d+)-(\d*)", self.headers.get("Range", "")
+                )
+                if_range = self.headers.get("If-Range")
+                if match and not server.ignore_ranges and if_range in (None, etag):
+                    start = int(match[1])
+                    end = int(match[2]) if match[2] else len(body) - 1
+                    if start >= len(body):
+                        headers["Content-Range"] = f"bytes */{len(body)}"
+                        self.respond(416, b"", headers)
+                        return
+                    end = min(end, len(body) - 1)
+                    headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+                    self.respond(206, body[start : end + 1], headers)
+                else:
+                    self.respond(200, body, headers)
+
+            def respond(
+                self, status: int, body: bytes, headers: dict[str, str]
+            ) -> None:
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def add(self, name: str, body: bytes, content_type: str = "image/jpeg") -> None:
+        """Serve `body` at /`name`, with a new ETag"""
+        self.files[name] = (body, content_type)
+        self.etags[name] = f'"{name}-{len(self.etags)}"'
+
+    def fail(self, name: str, responses: list[tuple[int, dict[str, str]]]) -> None:
+        """Answer the next requests for /`name` with these statuses and headers"""
+        with self._lock:
+            self.failures.setdefault(name, []).extend(responses)
+
+    def range_requests(self) -> list[str]:
+        return [headers["Range"] for _, headers in self.requests if "Range" in headers]
@@ -0,0 +1,43 @@
+import pytest
+
+from benchmarks.generate import generate_album
+from photoalbum.album import Album
+
+
+def parsed_album() -> Album:
+    album = Album()
+    album.protobuf = generate_album(20, 5, 3, 2, "https://example.com/img", seed=1)
+    album.parse_protobuf()
+    return album
+
+
+def positions(album: Album) -> list[str | None]:
+    return [item.ordering_str for item in album.ordered_items()]
+
+
+def test_ordered_items() -> None:
+    album = parsed_album()
+    assert album.images is not None and album.enrichments is not None
+
+    assert len(album.ordered_items()) == 30
+    assert positions(album) == sorted(positions(album))
+    assert album.ordered_items() is album.ordered_items()
+
+
+def test_ordered_items_updated() -> None:
+    """Changing the items rebuilds the order, and they can't be changed in place"""
+    album = parsed_album()
+    assert album.images is not None and album.enrichments is not None
+    removed = album.images[0]
+    moved = album.enrichments[-1]
+    moved.ordering_str = "0"
+    album.ordered_items()
+
+    album.images = album.images[1:]
+    album.enrichments = [moved, *album.enrichments[:-1]]
+
+    assert removed not in album.ordered_items()
+    assert album.ordered_items()[0] is moved
+    assert positions(album) == sorted(positions(album))
+    with pytest.raises(AttributeError):
+        album.images.append(removed)  # type: ignore[attr-defined]
@@ -0,0 +1,30 @@
+from pathlib import Path
+
+import pytest
+
+from photoalbum.atomic import atomic_path, write_atomic
+
+
+def test_write_atomic(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_bytes(b"old")
+
+    write_atomic(path, b"new")
+
+    assert path.read_bytes() == b"new"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_atomic_path_error(tmp_path: Path) -> None:
+    """If writing fails, the old file is left and the temporary one removed"""
+    path = tmp_path / "file"
+    path.write_bytes(b"old")
+
+    with pytest.raises(RuntimeError):
+        with atomic_path(path) as temp:
+            assert not temp.exists()
+            temp.write_bytes(b"partial")
+            raise RuntimeError()
+
+    assert path.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [path]
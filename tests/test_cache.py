@@ -0,0 +1,36 @@
+import os
+import time
+from pathlib import Path
+
+from photoalbum.cache import entries_to_evict, mark_used
+
+
+def test_evict_least_recently_used() -> None:
+    entries = [
+        (False, 30.0, 100, "c"),
+        (False, 10.0, 100, "a"),
+        (False, 20.0, 100, "b"),
+    ]
+
+    assert entries_to_evict(entries, max_bytes=300) == []
+    assert entries_to_evict(entries, max_bytes=200) == ["a"]
+    assert entries_to_evict(entries, max_bytes=150) == ["a", "b"]
+    assert entries_to_evict(entries, max_bytes=0) == ["a", "b", "c"]
+
+
+def test_evict_expired_first() -> None:
+    """Expired entries are evicted even if the cache fits, before any others"""
+    entries = [(False, 10.0, 100, "old"), (True, 20.0, 100, "expired")]
+
+    assert entries_to_evict(entries, max_bytes=1000) == ["expired"]
+    assert entries_to_evict(entries, max_bytes=0) == ["expired", "old"]
+
+
+def test_mark_used(tmp_path: Path) -> None:
+    path = tmp_path / "entry"
+    path.write_bytes(b"")
+    os.utime(path, (0, 0))
+
+    mark_used(path)
+
+    assert time.time() - path.stat().st_mtime < 60
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from photoalbum.image import Image
+from photoalbum.manifest import Manifest
+
+
+@pytest.fixture
+def image(make_image: Callable[..., Image]) -> Image:
+    return make_image("https://example.com/photo", "photo")
+
+
+def test_load_corrupt(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """A manifest that can't be read is started again rather than crashing"""
+    path = tmp_path / Manifest.FILENAME
+    path.write_text('{"photo": {"path": ')
+
+    with caplog.at_level(logging.WARNING):
+        manifest = Manifest.load(path)
+
+    assert manifest.entries == {}
+    assert "starting a new manifest" in caplog.text
+
+
+def test_save_and_load(tmp_path: Path, image: Image) -> None:
+    manifest = Manifest(tmp_path / Manifest.FILENAME)
+    manifest.record(image, "d", Path("photo.jpg"), 3, "abc")
+    manifest.save()
+
+    assert Manifest.load(manifest.path).entries == manifest.entries
+
+
+def test_new_image(album_directory: Path, image: Image) -> None:
+    manifest = Manifest(album_directory / Manifest.FILENAME)
+
+    assert manifest.needs_download(image, "d", album_directory, None)
+
+
+def test_adopt(album_directory: Path, image: Image) -> None:
+    """A file that's there but not in the manifest is recorded, not fetched"""
+    (album_directory / "photo.jpg").write_bytes(b"photo")
+    manifest = Manifest(album_directory / Manifest.FILENAME)
+
+    assert not manifest.needs_download(image, "d", album_directory, Path("photo.jpg"))
+    assert manifest.entries["photo"] == {
+        "path": "photo.jpg",
+        "size": "d",
+        "bytes": 5,
+        "sha256": hashlib.sha256(b"photo").hexdigest(),
+        "ordering_str": image.ordering_str,
+        "base_url": image.base_url,
+    }
+
+
+def test_changed(album_directory: Path, image: Image) -> None:
+    """An image is fetched again if it's wanted at another size, or its file has changed"""
+    path = Path("photo.jpg")
+    (album_directory / path).write_bytes(b"photo")
+    manifest = Manifest(album_directory / Manifest.FILENAME)
+    manifest.record(image, "d", path, 5, hashlib.sha256(b"photo").hexdigest())
+
+    assert not manifest.needs_download(image, "d", album_directory, path)
+    assert manifest.needs_download(image, "w800-h3000", album_directory, path)
+
+    (album_directory / path).write_bytes(b"truncated")
+    assert manifest.needs_download(image, "d", album_directory, path)
+
+
+def test_dropped_original(album_directory: Path, image: Image) -> None:
+    """An original dropped after optimizing isn't fetched while its optimized copy is there"""
+    manifest = Manifest(album_directory / Manifest.FILENAME)
+    manifest.record(image, "d", Path("photo.jpg"), 5, "abc")
+    manifest.record_optimized(
+        image,
+        {"path": "optimized/photo.webp", "original_dropped": True},
+    )
+
+    assert manifest.needs_download(image, "d", album_directory, None)
+    (album_directory / "optimized").mkdir()
+    (album_directory / "optimized" / "photo.webp").write_bytes(b"webp")
+    assert not manifest.needs_download(image, "d", album_directory, None)
+    assert manifest.needs_download(image, "w800-h3000", album_directory, None)
+
+
+def test_missing_from(tmp_path: Path, make_image: Callable[..., Image]) -> None:
+    manifest = Manifest(tmp_path / Manifest.FILENAME)
+    images = [make_image("https://example.com/photo", name) for name in "abc"]
+    for image in images:
+        manifest.record(image, "d", Path(f"{image.file_id}.jpg"), 5, "abc")
+
+    assert manifest.missing_from(images) == []
+    assert manifest.missing_from(images[1:]) == ["a"]
+    assert manifest.missing_from([]) == ["a", "b", "c"]
@@ -0,0 +1,48 @@
+import io
+from typing import Callable
+
+import pytest
+
+from photoalbum.album import Album
+from photoalbum.image import Image
+from photoalbum.optimize import Optimizer
+
+from .server import FileServer
+
+PILImage = pytest.importorskip("PIL.Image")
+
+
+def photo(width: int, height: int) -> bytes:
+    output = io.BytesIO()
+    PILImage.new("RGB", (width, height), "red").save(output, "JPEG")
+    return output.getvalue()
+
+
+def test_dropped_originals_rendered(
+    file_server: FileServer, album: Album, make_image: Callable[..., Image]
+) -> None:
+    """After --drop-originals, a later plain download still links the optimized copies"""
+    file_server.add("photo", photo(64, 48))
+    album.images = [make_image(f"{file_server.url}/photo", "photo")]
+    album.download_images()
+    album.optimize_images(Optimizer("webp", keep_originals=False, jobs=1))
+    assert not (album.full_directory / "photo.jpg").exists()
+
+    # A later run parses the images again, and reads the manifest from disk
+    album.manifest = None
+    album.images = [make_image(f"{file_server.url}/photo", "photo")]
+    album.download_images()
+    html = album.render_html().read_text()
+
+    assert len(file_server.requests) == 1
+    assert '<img src="optimized/photo.webp"' in html
+    assert 'src="None"' not in html
+
+
+def test_missing_images_not_rendered(
+    album: Album, make_image: Callable[..., Image]
+) -> None:
+    album.images = [make_image("https://example.com/photo", "photo")]
+    html = album.render_html().read_text()
+
+    assert "<img" not in html
@@ -0,0 +1,43 @@
+import os
+import time
+from pathlib import Path
+
+from photoalbum.page_cache import PageCache
+
+PROTOBUF = [None, [["image", 1]], None, [None, "Album"]]
+
+
+def test_store_and_load(tmp_path: Path) -> None:
+    cache = PageCache(tmp_path)
+    cache.store("https://example.com/a", {"etag": '"a"'}, PROTOBUF)
+
+    assert cache.get("https://example.com/a") == {"etag": '"a"'}
+    assert cache.load("https://example.com/a") == PROTOBUF
+    assert cache.get("https://example.com/b") is None
+
+
+def test_evict_expired(tmp_path: Path) -> None:
+    cache = PageCache(tmp_path, max_age=60)
+    cache.store("https://example.com/a", {"etag": '"a"'}, PROTOBUF)
+    entry_path, _ = cache._paths("https://example.com/a")
+    old = time.time() - 120
+    os.utime(entry_path, (old, old))
+
+    assert len(cache.evict()) == 1
+    assert not list(tmp_path.iterdir())
+
+
+def test_evict_leaves_other_files(tmp_path: Path) -> None:
+    """Only entries are evicted, even if the cache shares a directory"""
+    (tmp_path / "manifest.json").write_text("{}")
+    (tmp_path / "settings.json").write_text("{}")
+    (tmp_path / "album.pb").write_bytes(b"")
+    cache = PageCache(tmp_path, max_bytes=0)
+    cache.store("https://example.com/a", {"etag": '"a"'}, PROTOBUF)
+
+    assert len(cache.evict()) == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "album.pb",
+        "manifest.json",
+        "settings.json",
+    ]
@@ -0,0 +1,145 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Callable
+
+from photoalbum.image import Image
+
+from .server import FileServer
+
+
+def partial_download(
+    directory: Path, file_id: str, url: str, body: bytes, etag: str
+) -> None:
+    """Leave the first half of `body` as an interrupted download would"""
+    (directory / f".{file_id}.part").write_bytes(body[: len(body) // 2])
+    validators = {
+        "url": url,
+        "etag": etag,
+        "last_modified": None,
+        "length": str(len(body)),
+    }
+    (directory / f".{file_id}.part.json").write_text(json.dumps(validators))
+
+
+def test_download(
+    file_server: FileServer,
+    album_directory: Path,
+    jpeg: Callable[[int], bytes],
+    make_image: Callable[..., Image],
+) -> None:
+    body = jpeg(10_000)
+    file_server.add("photo", body)
+    image = make_image(f"{file_server.url}/photo", "photo")
+
+    path = image.download_image(album_directory)
+
+    assert path == album_directory / "photo.jpg"
+    assert path.read_bytes() == body
+    assert image.size_bytes == len(body)
+    assert image.sha256 == hashlib.sha256(body).hexdigest()
+    assert not list(album_directory.glob(".*"))
+
+
+def test_resume_partial(
+    file_server: FileServer,
+    album_directory: Path,
+    jpeg: Callable[[int], bytes],
+    make_image: Callable[..., Image],
+) -> None:
+    body = jpeg(10_000)
+    file_server.add("photo", body)
+    image = make_image(f"{file_server.url}/photo", "photo")
+    partial_download(
+        album_directory,
+        "photo",
+        f"{file_server.url}/photo=d",
+        body,
+        file_server.etags["photo"],
+    )
+
+    path = image.download_image(album_directory)
+
+    assert file_server.range_requests() == [f"bytes={len(body) // 2}-"]
+    assert path and path.read_bytes() == body
+    assert image.size_bytes == len(body)
+    assert image.sha256 == hashlib.sha256(body).hexdigest()
+    assert not list(album_directory.glob(".*"))
+
+
+def test_resume_ignored(
+    file_server: FileServer,
+    album_directory: Path,
+    jpeg: Callable[[int], bytes],
+    make_image: Callable[..., Image],
+) -> None:
+    """A server that ignores the range sends the whole file, which replaces the partial one"""
+    body = jpeg(10_000)
+    file_server.add("photo", body)
+    file_server.ignore_ranges = True
+    image = make_image(f"{file_server.url}/photo", "photo")
+    partial_download(
+        album_directory,
+        "photo",
+        f"{file_server.url}/photo=d",
+        body,
+        file_server.etags["photo"],
+    )
+
+    path = image.download_image(album_directory)
+
+    assert file_server.range_requests() == [f"bytes={len(body) // 2}-"]
+    assert path and path.read_bytes() == body
+    assert image.sha256 == hashlib.sha256(body).hexdigest()
+
+
+def test_resume_changed(
+    file_server: FileServer,
+    album_directory: Path,
+    jpeg: Callable[[int], bytes],
+    make_image: Callable[..., Image],
+) -> None:
+    """If the file changed since the partial download, If-Range gets the new one"""
+    old = jpeg(10_000)
+    file_server.add("photo", old)
+    old_etag = file_server.etags["photo"]
+    new = jpeg(12_000)
+    file_server.add("photo", new)
+    image = make_image(f"{file_server.url}/photo", "photo")
+    partial_download(
+        album_directory, "photo", f"{file_server.url}/photo=d", old, old_etag
+    )
+
+    path = image.download_image(album_directory)
+
+    _, headers = file_server.requests[0]
+    assert headers["If-Range"] == old_etag
+    assert path and path.read_bytes() == new
+
+
+def test_resume_unsatisfiable(
+    file_server: FileServer,
+    album_directory: Path,
+    jpeg: Callable[[int], bytes],
+    make_image: Callable[..., Image],
+) -> None:
+    """A 416 means the partial file is no good, so it starts again"""
+    body = jpeg(10_000)
+    file_server.add("photo", body)
+    image = make_image(f"{file_server.url}/photo", "photo")
+    # Longer than the file, but the recorded length doesn't say so
+    (album_directory / ".photo.part").write_bytes(jpeg(20_000))
+    validators = {
+        "url": f"{file_server.url}/photo=d",
+        "etag": file_server.etags["photo"],
+        "last_modified": None,
+        "length": None,
+    }
+    (album_directory / ".photo.part.json").write_text(json.dumps(validators))
+
+    path = image.download_image(album_directory)
+
+    assert file_server.range_requests() == ["bytes=20000-"]
+    assert len(file_server.requests) == 2
+    assert path and path.read_bytes() == body
+    assert not list(album_directory.glob(".*"))
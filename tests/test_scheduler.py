@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from photoalbum.scheduler import RequestError, RequestScheduler
+
+from .server import FileServer
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retry_after(file_server: FileServer, status: int) -> None:
+    file_server.add("photo", b"photo")
+    file_server.fail("photo", [(status, {"Retry-After": "0"})])
+    scheduler = RequestScheduler(backoff=0)
+
+    with scheduler.get(f"{file_server.url}/photo") as response:
+        assert response.status_code == 200
+        assert response.content == b"photo"
+    assert len(file_server.requests) == 2
+
+
+@pytest.mark.parametrize("retry_after", ["3600", "Fri, 31 Dec 2100 23:59:59 GMT"])
+def test_retry_after_capped(file_server: FileServer, retry_after: str) -> None:
+    """A Retry-After longer than max_backoff only waits max_backoff"""
+    file_server.add("photo", b"photo")
+    file_server.fail("photo", [(429, {"Retry-After": retry_after})])
+    scheduler = RequestScheduler(max_backoff=0.01)
+
+    start = time.monotonic()
+    with scheduler.get(f"{file_server.url}/photo") as response:
+        assert response.status_code == 200
+
+    assert time.monotonic() - start < 5
+    assert len(file_server.requests) == 2
+
+
+def test_retries_exhausted(file_server: FileServer) -> None:
+    file_server.add("photo", b"photo")
+    file_server.fail("photo", [(500, {})] * 3)
+    scheduler = RequestScheduler(retries=2, backoff=0)
+
+    with pytest.raises(RequestError, match="after 3 attempts: 500"):
+        with scheduler.get(f"{file_server.url}/photo"):
+            pass
+    assert len(file_server.requests) == 3
+
+
+def test_not_retried(file_server: FileServer) -> None:
+    """Other error statuses are returned for the caller to handle"""
+    scheduler = RequestScheduler(backoff=0)
+
+    with scheduler.get(f"{file_server.url}/missing") as response:
+        assert response.status_code == 404
+    assert len(file_server.requests) == 1
+
+
+def test_concurrency_adapts(file_server: FileServer) -> None:
+    """Throttling halves the host's concurrency, and successes grow it back"""
+    url = f"{file_server.url}/photo"
+    file_server.add("photo", b"photo")
+    file_server.fail("photo", [(429, {"Retry-After": "0"}), (503, {})])
+    scheduler = RequestScheduler(max_concurrency=4, backoff=0)
+    _, limit = scheduler._host(url)
+
+    # Halved to 2 then 1, then grown back to 2 by the request succeeding
+    with scheduler.get(url):
+        pass
+    assert limit.limit == 2
+
+    limits = []
+    for _ in range(7):
+        with scheduler.get(url):
+            pass
+        limits.append(limit.limit)
+    assert limits == [2, 3, 3, 3, 4, 4, 4]
+    assert limit.in_flight == 0
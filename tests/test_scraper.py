@@ -0,0 +1,43 @@
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.generate import generate_album
+from benchmarks.server import AlbumServer
+
+SCRAPER = Path(__file__).parents[1] / "scraper.py"
+
+
+def test_watch_batch(tmp_path: Path) -> None:
+    """--watch with --batch keeps the albums mirrored, and exits cleanly when interrupted"""
+    with AlbumServer() as server:
+        server.set_album(generate_album(5, 2, 1, 1, server.image_url))
+        batch = tmp_path / "albums.txt"
+        batch.write_text(f"{server.album_url}\n")
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                str(SCRAPER),
+                "--batch",
+                str(batch),
+                "--watch",
+                "0.1",
+                "--render",
+                "--output-directory",
+                str(tmp_path),
+            ],
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        deadline = time.monotonic() + 30
+        while not list(tmp_path.glob("*/index.html")):
+            assert process.poll() is None, process.communicate()[1]
+            assert time.monotonic() < deadline, "Album never rendered"
+            time.sleep(0.1)
+        process.send_signal(signal.SIGINT)
+        _, stderr = process.communicate(timeout=30)
+
+    assert process.returncode == 0, stderr
+    assert "Traceback" not in stderr
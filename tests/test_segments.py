@@ -0,0 +1,132 @@
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from photoalbum.album import Album
+from photoalbum.downloader import Downloader, DownloadStatus
+from photoalbum.image import Image
+from photoalbum.video import Video
+
+from .server import FileServer
+
+MP4_HEADER = b"\x00\x00\x00\x18ftypmp42"
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Image, "SEGMENT_SIZE", 1024)
+
+
+def video(size: int) -> bytes:
+    """An MP4 header padded with varying bytes to `size`"""
+    return MP4_HEADER + bytes(i % 251 for i in range(size - len(MP4_HEADER)))
+
+
+def download_with_timeout(
+    images: list[Image], directory: Path, jobs: int, segments: int
+) -> dict[DownloadStatus, list[Image]]:
+    """Download `images`, failing rather than hanging if they never finish"""
+    results = {}
+
+    def download() -> None:
+        with Downloader(jobs=jobs, segments=segments) as downloader:
+            results.update(downloader.download_images(images, directory).results)
+
+    thread = threading.Thread(target=download, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "Download didn't finish"
+    return results
+
+
+def test_segments(
+    file_server: FileServer, album_directory: Path, make_image: Callable[..., Image]
+) -> None:
+    body = video(10_000)
+    file_server.add("clip", body, "video/mp4")
+    clip = make_image(f"{file_server.url}/clip", "clip", video=True)
+
+    path = clip.download_image(album_directory, segments=4)
+
+    assert path == album_directory / "clip.mp4"
+    assert path.read_bytes() == body
+    assert clip.sha256 == hashlib.sha256(body).hexdigest()
+    ranges = file_server.range_requests()
+    assert ranges[0] == "bytes=0-1023"
+    assert sorted(ranges[1:]) == [
+        "bytes=1024-3267",
+        "bytes=3268-5511",
+        "bytes=5512-7755",
+        "bytes=7756-9999",
+    ]
+    assert all(
+        headers["If-Range"] == file_server.etags["clip"]
+        for _, headers in file_server.requests[1:]
+    )
+    assert not list(album_directory.glob(".*"))
+
+
+def test_segments_ignored(
+    file_server: FileServer, album_directory: Path, make_image: Callable[..., Image]
+) -> None:
+    """If the server ignores ranges, the first response has the whole file"""
+    body = video(10_000)
+    file_server.add("clip", body, "video/mp4")
+    file_server.ignore_ranges = True
+    clip = make_image(f"{file_server.url}/clip", "clip", video=True)
+
+    path = clip.download_image(album_directory, segments=4)
+
+    assert path and path.read_bytes() == body
+    assert len(file_server.requests) == 1
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_segments_share_host_limit(
+    file_server: FileServer,
+    album_directory: Path,
+    jobs: int,
+    make_image: Callable[..., Image],
+) -> None:
+    """Segments don't wait on a host slot held by their own first range"""
+    bodies = {f"clip{i}": video(10_000 + i) for i in range(4)}
+    for name, body in bodies.items():
+        file_server.add(name, body, "video/mp4")
+    clips = [
+        make_image(f"{file_server.url}/{name}", name, video=True) for name in bodies
+    ]
+
+    results = download_with_timeout(clips, album_directory, jobs=jobs, segments=4)
+
+    assert len(results[DownloadStatus.DOWNLOADED]) == len(clips)
+    for name, body in bodies.items():
+        assert (album_directory / f"{name}.mp4").read_bytes() == body
+
+
+def test_video(
+    file_server: FileServer,
+    album: Album,
+    jpeg: Callable[[int], bytes],
+    make_image: Callable[..., Image],
+) -> None:
+    file_server.add("clip", video(10_000), "video/mp4")
+    file_server.add("photo", jpeg(2_000))
+    clip = make_image(f"{file_server.url}/clip", "clip", video=True)
+    photo = make_image(f"{file_server.url}/photo", "photo")
+    assert isinstance(clip, Video)
+    assert not isinstance(photo, Video)
+
+    album.images = [photo, clip]
+    with Downloader(jobs=1, segments=4) as downloader:
+        album.download_images(downloader=downloader, variant_widths=[100])
+    html = album.render_html().read_text()
+
+    # Videos are always the original, and don't have variants
+    assert {path for path, _ in file_server.requests if "clip" in path} == {"/clip=dv"}
+    assert not (album.full_directory / "w100" / "clip.mp4").exists()
+    assert (album.full_directory / "w100" / "photo.jpg").exists()
+    assert '<video src="clip.mp4" controls' in html
+    assert '<img src="photo.jpg"' in html
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from benchmarks.generate import generate_album
+from photoalbum.album import Album
+from photoalbum.snapshot import CompactReader, is_compact, read_protobuf, write_protobuf
+
+ARRAYS = (Album.IMAGE_ARRAY_INDEX, Album.ENRICHMENT_ARRAY_INDEX)
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    """The compact format reads back the same as formatted JSON"""
+    protobuf = generate_album(20, 5, 3, 2, seed=1)
+    plain = tmp_path / "album.json"
+    compact = tmp_path / "album.pb"
+
+    write_protobuf(protobuf, plain)
+    write_protobuf(protobuf, compact, compact=True, arrays=ARRAYS)
+
+    assert not is_compact(plain)
+    assert is_compact(compact)
+    assert read_protobuf(plain) == protobuf
+    assert read_protobuf(compact) == protobuf
+
+
+def test_compact_reader(tmp_path: Path) -> None:
+    """Items are read one at a time, after a skeleton without them"""
+    protobuf = generate_album(20, 5, 3, 2, seed=1)
+    path = tmp_path / "album.pb"
+    write_protobuf(protobuf, path, compact=True, arrays=ARRAYS)
+
+    with CompactReader(path) as reader:
+        assert (
+            reader.skeleton[Album.ALBUM_ARRAY_INDEX]
+            == protobuf[Album.ALBUM_ARRAY_INDEX]
+        )
+        assert reader.skeleton[Album.IMAGE_ARRAY_INDEX] == []
+        assert reader.counts == {
+            Album.IMAGE_ARRAY_INDEX: 20,
+            Album.ENRICHMENT_ARRAY_INDEX: 10,
+        }
+        items = list(reader.items())
+
+    assert items == [(index, item) for index in ARRAYS for item in protobuf[index]]
@@ -0,0 +1,34 @@
+from pathlib import Path
+from typing import Callable
+
+from photoalbum.album import Album
+from photoalbum.image import Image
+from photoalbum.store import BlobStore
+
+from .server import FileServer
+
+
+def test_redownload_replaces_blob(
+    file_server: FileServer,
+    album: Album,
+    jpeg: Callable[[int], bytes],
+    make_image: Callable[..., Image],
+    tmp_path: Path,
+) -> None:
+    """--redownload fetches the image again rather than linking a possibly corrupt blob"""
+    body = jpeg(2_000)
+    file_server.add("photo", body)
+    store = BlobStore(tmp_path / "store")
+    album.images = [make_image(f"{file_server.url}/photo", "photo")]
+    album.download_images(store=store)
+    blob = store.lookup("photo", "d")
+    assert blob and blob.read_bytes() == body
+
+    # Corrupt the blob, and the album's link to it
+    (album.full_directory / "photo.jpg").unlink()
+    blob.write_bytes(b"corrupt")
+    album.download_images(store=store, redownload=True)
+
+    assert len(file_server.requests) == 2
+    assert (album.full_directory / "photo.jpg").read_bytes() == body
+    assert blob.read_bytes() == body
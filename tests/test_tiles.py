@@ -0,0 +1,24 @@
+import os
+from pathlib import Path
+
+from photoalbum.tiles import TileCache
+
+
+def test_evict_leaves_other_files(tmp_path: Path) -> None:
+    """Only tiles are evicted, even if the cache shares a directory"""
+    other_files = [
+        tmp_path / "notes.txt",
+        tmp_path / "0123456789ab.json",
+        tmp_path / "album" / "1" / "2" / "3.png",
+    ]
+    for path in other_files:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"\0" * 100)
+        os.utime(path, (0, 0))
+    cache = TileCache(tmp_path, max_bytes=0)
+    tile_path = cache.directory / cache.tile_path((1, 0, 0))
+    tile_path.parent.mkdir(parents=True)
+    tile_path.write_bytes(b"\0" * 100)
+
+    assert cache.evict() == [tile_path]
+    assert all(path.exists() for path in other_files)
@@ -0,0 +1,40 @@
+from typing import Callable
+
+from photoalbum.album import Album
+from photoalbum.image import Image
+
+from .server import FileServer
+
+
+def test_srcset_downloaded_width(
+    file_server: FileServer,
+    album: Album,
+    jpeg: Callable[[int], bytes],
+    make_image: Callable[..., Image],
+) -> None:
+    """The full image is listed at the width it was downloaded, not the original's"""
+    file_server.add("photo", jpeg(2_000))
+    image = make_image(f"{file_server.url}/photo", "photo", width=4000)
+    album.images = [image]
+
+    album.download_images(max_width=800, variant_widths=[400, 800, 1920])
+
+    assert sorted(path for path, _ in file_server.requests) == [
+        "/photo=w400-h3000",
+        "/photo=w800-h3000",
+    ]
+    assert image.downloaded_width == 800
+    assert image.srcset == "w400/photo.jpg 400w, photo.jpg 800w"
+
+    album.images = [make_image(f"{file_server.url}/photo", "photo", width=4000)]
+    album.find_local_images()
+    assert album.images[0].srcset == "w400/photo.jpg 400w, photo.jpg 800w"
+
+
+def test_scaled_width(make_image: Callable[..., Image]) -> None:
+    image = make_image("https://example.com/photo", "photo", width=4000)
+
+    assert image.scaled_width("d") == 4000
+    assert image.scaled_width("w800-h3000") == 800
+    assert image.scaled_width("w4000-h600") == 800
+    assert image.scaled_width("w8000-h6000") == 4000
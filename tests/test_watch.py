@@ -0,0 +1,67 @@
+import random
+from pathlib import Path
+
+from benchmarks.generate import ORDERING_KEY, generate_album, image_item, ordering_str
+from benchmarks.server import AlbumServer
+from photoalbum.album import Album
+from photoalbum.image import Image
+from photoalbum.watch import AlbumWatcher
+
+
+def test_poll(tmp_path: Path) -> None:
+    """Only added images are downloaded, removed ones are deleted, and the HTML is rendered again"""
+    downloaded: list[list[str]] = []
+    rendered: list[Album] = []
+
+    def configure(album: Album) -> None:
+        album.output_directory = tmp_path
+
+    def download(album: Album, images: list[Image]) -> None:
+        downloaded.append(sorted(str(image.file_id) for image in images))
+        album.download_images(images=images)
+
+    with AlbumServer(image_bytes=1000) as server:
+        protobuf = generate_album(5, 2, 0, 0, server.image_url, seed=1)
+        server.set_album(protobuf)
+        watcher = AlbumWatcher(
+            server.album_url,
+            configure=configure,
+            download=download,
+            render=rendered.append,
+        )
+
+        changes = watcher.poll()
+        assert changes and changes.items_changed
+        assert len(changes.added) == 5
+        assert len(downloaded) == 1 and len(rendered) == 1
+        assert watcher.poll() is None
+
+        images = protobuf[Album.IMAGE_ARRAY_INDEX]
+        removed = images.pop(0)
+        changed = images[0]
+        changed[-1][ORDERING_KEY] = [0, ordering_str(100)]
+        added = image_item(random.Random(1), 101, server.image_url)
+        images.append(added)
+        server.set_album(protobuf)
+        previous = watcher.album
+        assert previous is not None
+        changes = watcher.poll()
+
+    assert changes is not None
+    assert [image.file_id for image in changes.added] == [added[3]]
+    assert changes.removed == {removed[3]}
+    assert changes.items_changed
+    assert downloaded[1] == [added[3]]
+    assert len(rendered) == 2
+
+    album = watcher.album
+    assert album is not None
+    assert not list(album.full_directory.glob(f"{removed[3]}.*"))
+    old_images = {image.file_id: image for image in previous.images or []}
+    for image in album.images or []:
+        assert image.src is not None
+        assert (album.full_directory / image.src).exists()
+        if image.file_id in old_images:
+            # Carried over from the last poll, rather than looked for again
+            assert image.relative_path == old_images[image.file_id].relative_path
+            assert image.src == old_images[image.file_id].src